@@ -3,7 +3,6 @@
 
 import time
 import math
-import smbus
 
 # ============================================================================
 # Raspi PCA9685 16-Channel PWM Servo Driver
@@ -26,14 +25,26 @@ class PCA9685:
     __ALLLED_ON_H = 0xFB
     __ALLLED_OFF_L = 0xFC
     __ALLLED_OFF_H = 0xFD
-
-    def __init__(self, address=0x40, debug=False):
-        self.bus = smbus.SMBus(1)
+    __MODE1_AI = 0x20  # Register auto-increment
+    # Most bytes in one SMBus block transfer (8 channels).
+    MAX_BLOCK = 32
+
+    def __init__(self, address=0x40, debug=False, bus=None, auto_increment=True):
+        if bus is None:
+            import smbus
+            bus = smbus.SMBus(1)
+        self.bus = bus
         self.address = address
         self.debug = debug
+        # With auto-increment a channel (4 registers) is written in one block transfer,
+        # otherwise with one transfer per register.
+        self.auto_increment = auto_increment
+        # Last (on, off) written to each channel, to skip writes that change nothing.
+        # Unknown after a reset or sleep.
+        self.channels = {}
         if self.debug:
             print("Reseting PCA9685")
-        self.write(self.__MODE1, 0x00)
+        self.write(self.__MODE1, self.__MODE1_AI if auto_increment else 0x00)
 
     def write(self, reg, value):
         "Writes an 8-bit value to the specified register/address"
@@ -41,6 +52,16 @@ class PCA9685:
         if self.debug:
             print("I2C: Write 0x%02X to register 0x%02X" % (value, reg))
 
+    def writeBlock(self, reg, values):
+        "Writes consecutive registers starting at `reg` (one transfer with auto-increment)"
+        if self.auto_increment:
+            self.bus.write_i2c_block_data(self.address, reg, list(values))
+            if self.debug:
+                print("I2C: Write %d bytes from register 0x%02X" % (len(values), reg))
+        else:
+            for i, value in enumerate(values):
+                self.write(reg + i, value)
+
     def read(self, reg):
         "Read an unsigned byte from the I2C device"
         result = self.bus.read_byte_data(self.address, reg)
@@ -64,27 +85,155 @@ class PCA9685:
         if self.debug:
             print("Final pre-scale: %d" % prescale)
 
-        oldmode = self.read(self.__MODE1)
-        newmode = (oldmode & 0x7F) | 0x10  # sleep
-        self.write(self.__MODE1, newmode)  # go to sleep
+        oldmode = self.sleep()
         self.write(self.__PRESCALE, int(math.floor(prescale)))
         self.write(self.__MODE1, oldmode)
         time.sleep(0.005)
         self.write(self.__MODE1, oldmode | 0x80)
 
+    def sleep(self):
+        "Puts the oscillator to sleep (outputs off), returns the previous MODE1"
+        oldmode = self.read(self.__MODE1)
+        newmode = (oldmode & 0x7F) | 0x10  # sleep
+        self.write(self.__MODE1, newmode)  # go to sleep
+        self.invalidate()
+        return oldmode
+
+    def invalidate(self):
+        "Forgets the channel values, the next write of every channel goes to the chip"
+        self.channels.clear()
+
     def setPWM(self, channel, on, off):
-        "Sets a single PWM channel"
-        self.write(self.__LED0_ON_L + 4 * channel, on & 0xFF)
-        self.write(self.__LED0_ON_H + 4 * channel, on >> 8)
-        self.write(self.__LED0_OFF_L + 4 * channel, off & 0xFF)
-        self.write(self.__LED0_OFF_H + 4 * channel, off >> 8)
+        "Sets a single PWM channel (skipped if it already has these values)"
+        if self.channels.get(channel) == (on, off):
+            return
+        try:
+            self.writeBlock(self.__LED0_ON_L + 4 * channel, [on & 0xFF, on >> 8, off & 0xFF, off >> 8])
+        except OSError:
+            # Some registers may have been written: the channel is unknown, the next write goes out.
+            self.channels.pop(channel, None)
+            raise
+        self.channels[channel] = (on, off)
         if self.debug:
             print("channel: %d  LED_ON: %d LED_OFF: %d" % (channel, on, off))
 
+    def setPWMs(self, channel, values):
+        "Sets consecutive PWM channels from `channel` on, `values` is a list of (on, off)"
+        per_block = self.MAX_BLOCK // 4
+        for i in range(0, len(values), per_block):
+            data = []
+            for on, off in values[i:i + per_block]:
+                data += [on & 0xFF, on >> 8, off & 0xFF, off >> 8]
+            block = dict(zip(range(channel + i, channel + i + per_block), values[i:i + per_block]))
+            try:
+                self.writeBlock(self.__LED0_ON_L + 4 * (channel + i), data)
+            except OSError:
+                for ch in block:
+                    self.channels.pop(ch, None)
+                raise
+            self.channels.update(block)
+        if self.debug:
+            print("channels: %d-%d  LED_ON/OFF: %s" % (channel, channel + len(values) - 1, values))
+
+    def setAllPWM(self, on, off):
+        "Sets all PWM channels at once"
+        try:
+            self.writeBlock(self.__ALLLED_ON_L, [on & 0xFF, on >> 8, off & 0xFF, off >> 8])
+        except OSError:
+            self.invalidate()
+            raise
+        self.channels = dict.fromkeys(range(16), (on, off))
+        if self.debug:
+            print("all channels: LED_ON: %d LED_OFF: %d" % (on, off))
+
+    @staticmethod
+    def servoOff(pulse):
+        "OFF count for a Servo Pulse in us"
+        return int(pulse * 4096 / 20000)  # PWM frequency is 50HZ,the period is 20000us
+
+    def isServoPulse(self, channel, pulse):
+        "True if the channel was last set to this Servo Pulse (and nothing was lost since)"
+        return self.channels.get(channel) == (0, self.servoOff(pulse))
+
     def setServoPulse(self, channel, pulse):
         "Sets the Servo Pulse,The PWM frequency must be 50HZ"
-        pulse = pulse * 4096 / 20000  # PWM frequency is 50HZ,the period is 20000us
-        self.setPWM(channel, 0, int(pulse))
+        self.setPWM(channel, 0, self.servoOff(pulse))
+
+    def setServoPulses(self, pulses):
+        "Sets several Servo Pulses ({channel: pulse}), consecutive channels in one transfer"
+        run = []
+        for channel in sorted(pulses):
+            if self.isServoPulse(channel, pulses[channel]):
+                continue
+            if run and channel != run[-1] + 1:
+                self.setPWMs(run[0], [(0, self.servoOff(pulses[ch])) for ch in run])
+                run = []
+            run.append(channel)
+        if run:
+            self.setPWMs(run[0], [(0, self.servoOff(pulses[ch])) for ch in run])
+
+
+class FakeSMBus:
+    """
+    Stands in for `smbus.SMBus` with the registers of a PCA9685, and counts the I2C
+    transactions and the bytes on the wire, for an estimate of the bus time.
+    """
+
+    def __init__(self, bus=1, bitrate=100000):
+        self.registers = bytearray(256)
+        self.bitrate = bitrate
+        self.transactions = 0
+        self.bytes = 0
+
+    def _transfer(self, nbytes):
+        # Plus the address byte.
+        self.transactions += 1
+        self.bytes += 1 + nbytes
+
+    def bus_time(self):
+        "Seconds on the bus: 9 bits per byte (with the ACK), plus START and STOP"
+        return (self.bytes * 9 + self.transactions * 2) / self.bitrate
+
+    def write_byte_data(self, address, reg, value):
+        self._transfer(2)
+        self.registers[reg] = value
+
+    def write_i2c_block_data(self, address, reg, data):
+        self._transfer(1 + len(data))
+        auto_increment = self.registers[0x00] & 0x20
+        for i, value in enumerate(data):
+            self.registers[(reg + i) & 0xFF if auto_increment else reg] = value
+
+    def read_byte_data(self, address, reg):
+        # Register write, then a repeated START to read the byte.
+        self._transfer(3)
+        return self.registers[reg]
+
+
+class SimulatedPCA9685(PCA9685):
+    """
+    `PCA9685` on a `FakeSMBus`, for running without the HAT: keeps the pulse of every
+    channel, and with `record=True` a log of (time.monotonic(), channel, pulse) for every write.
+    """
+
+    def __init__(self, address=0x40, debug=False, record=False, auto_increment=True):
+        self.pulses = {}
+        self.log = [] if record else None
+        PCA9685.__init__(self, address, debug, bus=FakeSMBus(), auto_increment=auto_increment)
+
+    def _record(self, channel, pulse):
+        self.pulses[channel] = pulse
+        if self.log is not None:
+            self.log.append((time.monotonic(), channel, pulse))
+
+    def setServoPulse(self, channel, pulse):
+        self._record(channel, pulse)
+        PCA9685.setServoPulse(self, channel, pulse)
+
+    def setServoPulses(self, pulses):
+        for channel, pulse in pulses.items():
+            self._record(channel, pulse)
+        PCA9685.setServoPulses(self, pulses)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,262 @@
+import json
+import logging
+import os
+import threading
+import time
+import wave
+import numpy as np
+
+logging.basicConfig(
+    format='%(asctime)s [%(levelname)s] %(filename)s:%(funcName)s: %(message)s',
+    level=logging.DEBUG,
+    handlers=[
+        logging.StreamHandler()  # Output logs to stdout
+    ]
+)
+
+# Used for whatever is missing in `asr_config.json`.
+ASR_DEFAULTS = {
+    "model": "base.en",
+    # Loaded instead of `model` in multilingual mode (language detection on).
+    "multilingual_model": "base",
+    "device": "cpu",
+    # int8 weights, float32 activations (the CPU default is float32 everywhere).
+    "compute_type": "int8",
+    # 0: let CTranslate2 decide.
+    "cpu_threads": 0,
+    # Number of transcriptions that can run in parallel.
+    "num_workers": 1,
+    "beam_size": 5,
+    # Skip language detection, e.g. "en". None: detect the language of every utterance.
+    "language": None,
+}
+
+def load_asr_config(config_file: str = 'asr_config.json', **overrides) -> dict:
+    """Whisper settings from `config_file` on top of `ASR_DEFAULTS`, then `overrides`."""
+    config = dict(ASR_DEFAULTS)
+    if config_file and os.path.exists(config_file):
+        with open(config_file) as f:
+            config.update(json.load(f))
+    elif config_file:
+        logging.warning(f"{config_file} not found, using the default ASR settings")
+    config.update(overrides)
+    return config
+
+def load_whisper_model(config: dict):
+    from faster_whisper import WhisperModel
+
+    t0 = time.time()
+    model = WhisperModel(config["model"], device=config["device"], compute_type=config["compute_type"],
+                         cpu_threads=config["cpu_threads"], num_workers=config["num_workers"])
+    logging.info(f"Loaded Whisper {config['model']} ({config['compute_type']}, "
+                 f"{config['cpu_threads']} threads) in {time.time() - t0:.2f}s")
+    return model
+
+def transcribe_options(config: dict) -> dict:
+    """Keyword arguments for `WhisperModel.transcribe`."""
+    return {"beam_size": config["beam_size"], "language": config["language"]}
+
+class AudioBuffer:
+    """
+    Growable float32 buffer for 16-bit PCM chunks coming from the microphone.
+
+    Chunks are converted as they are appended, so the audio is ready to be handed
+    to faster_whisper as soon as the recording stops (no WAV round trip on disk).
+    """
+    def __init__(self, sample_rate: int = 16000, capacity_seconds: float = 30.0):
+        self.sample_rate = sample_rate
+        self.samples = np.empty(int(sample_rate * capacity_seconds), dtype=np.float32)
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    def clear(self):
+        self.length = 0
+
+    def append(self, chunk: bytes):
+        pcm = np.frombuffer(chunk, dtype=np.int16)
+        end = self.length + len(pcm)
+        if end > len(self.samples):
+            # Double the capacity so long recordings only reallocate a few times.
+            grown = np.empty(max(end, 2 * len(self.samples)), dtype=np.float32)
+            grown[:self.length] = self.samples[:self.length]
+            self.samples = grown
+        np.multiply(pcm, 1.0 / 32768.0, out=self.samples[self.length:end], casting='unsafe')
+        self.length = end
+
+    def view(self) -> np.ndarray:
+        # No copy: only valid until the next `append` or `clear`.
+        return self.samples[:self.length]
+
+    def duration(self) -> float:
+        return self.length / self.sample_rate
+
+def pcm16_to_float32(chunks) -> np.ndarray:
+    """Convert a list of 16-bit PCM byte chunks into one preallocated float32 array."""
+    total = sum(len(c) for c in chunks) // 2
+    out = np.empty(total, dtype=np.float32)
+    pos = 0
+    for c in chunks:
+        pcm = np.frombuffer(c, dtype=np.int16)
+        np.multiply(pcm, 1.0 / 32768.0, out=out[pos:pos + len(pcm)], casting='unsafe')
+        pos += len(pcm)
+    return out
+
+def write_wav(filename: str, chunks, sample_rate: int = 16000, channels: int = 1, sample_width: int = 2):
+    wavefile = wave.open(filename, 'wb')
+    wavefile.setnchannels(channels)
+    wavefile.setsampwidth(sample_width)
+    wavefile.setframerate(sample_rate)
+    wavefile.writeframes(b''.join(chunks))
+    wavefile.close()
+    return filename
+
+def read_wav_chunks(filename: str, chunk_size: int = 1024):
+    """Read a 16-bit mono WAV file as a list of raw chunks, the way `record_audio` captures them."""
+    with wave.open(filename, 'rb') as wavefile:
+        if wavefile.getsampwidth() != 2 or wavefile.getnchannels() != 1:
+            raise ValueError(f"{filename}: expected 16-bit mono audio")
+        sample_rate = wavefile.getframerate()
+        chunks = []
+        while True:
+            data = wavefile.readframes(chunk_size)
+            if not data:
+                break
+            chunks.append(data)
+    return chunks, sample_rate
+
+class StreamingTranscriber:
+    """
+    Incremental transcription while the user is still talking.
+
+    A background thread re-decodes the not-yet-committed part of the recording every
+    `interval` seconds. All segments except the last one are considered stable: their
+    text is committed and the window start moves to the beginning of the last segment,
+    so later passes only decode the tail. When the recording stops, `finish` only needs
+    to decode what is left after the committed prefix.
+
+    With a `vad`, leading silence is skipped before it is ever decoded and trailing
+    silence is cut from the tail.
+    """
+    def __init__(self, model, buffer: AudioBuffer = None, beam_size: int = 5,
+                 interval: float = 2.0, max_window: float = 25.0, vad=None, **transcribe_options):
+        self.model = model
+        self.buffer = buffer if buffer is not None else AudioBuffer()
+        self.vad = vad
+        self.beam_size = beam_size
+        self.interval = interval
+        # Whisper works on 30s windows, force a commit before the tail gets that long.
+        self.max_window = max_window
+        self.transcribe_options = transcribe_options
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.reset()
+
+    def reset(self):
+        self.buffer.clear()
+        self.committed_text = []
+        self.committed_offset = 0   # In samples, start of the uncommitted window.
+        self.decoded_length = 0     # Buffer length at the last background decode.
+        self.info = None
+        self.num_decodes = 0
+        self.dropped = 0            # Samples of silence cut by the VAD.
+
+    def start(self):
+        self.reset()
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def feed(self, chunk: bytes):
+        with self.lock:
+            self.buffer.append(chunk)
+
+    def _window(self):
+        with self.lock:
+            length = len(self.buffer)
+            # Copy, `append` may reallocate the buffer under us.
+            return self.buffer.samples[self.committed_offset:length].copy(), length
+
+    def _recording(self, length):
+        # The VAD looks at the whole recording: the window alone may be all speech,
+        # with no silence to tell the speech from.
+        with self.lock:
+            return self.buffer.samples[:length].copy()
+
+    def _decode(self, audio):
+        prompt = "".join(self.committed_text)[-200:] or None
+        segments, info = self.model.transcribe(audio, beam_size=self.beam_size,
+                                               initial_prompt=prompt,
+                                               **self.transcribe_options)
+        self.info = info
+        self.num_decodes += 1
+        return list(segments)
+
+    def _run(self):
+        sample_rate = self.buffer.sample_rate
+        while not self.stop_event.wait(self.interval):
+            audio, length = self._window()
+            if length - self.decoded_length < self.interval * sample_rate:
+                continue
+            if self.vad and not self.committed_text:
+                bounds = self.vad.speech_bounds(self._recording(length))
+                if not bounds:
+                    # Nobody has said anything yet. Keep it all, the VAD may still change its mind.
+                    continue
+                # Move the window past the silence before the speech.
+                skip = max(0, bounds[0] - self.committed_offset)
+                self.committed_offset += skip
+                self.dropped += skip
+                audio = audio[skip:]
+            t0 = time.perf_counter()
+            segments = self._decode(audio)
+            self.decoded_length = length
+            window_full = len(audio) >= self.max_window * sample_rate
+            stable = segments if window_full else segments[:-1]
+            if stable:
+                self.committed_text.extend(s.text for s in stable)
+                if window_full:
+                    self.committed_offset += int(stable[-1].end * sample_rate)
+                else:
+                    self.committed_offset += int(segments[-1].start * sample_rate)
+                logging.debug(f"Committed {len(stable)} segments, window now starts at "
+                              f"{self.committed_offset / sample_rate:.2f}s")
+            logging.debug(f"Background decode of {len(audio) / sample_rate:.2f}s took "
+                          f"{time.perf_counter() - t0:.2f}s")
+
+    def cancel(self):
+        """Stop the background decoding and throw the recording away."""
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        self.reset()
+
+    def finish(self):
+        """Stop the background decoding and transcribe the remaining tail.
+
+        Returns:
+            tuple: (transcript, info) where info is the last faster_whisper TranscriptionInfo.
+        """
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        audio, length = self._window()
+        if self.vad and len(audio) > 0:
+            bounds = self.vad.speech_bounds(self._recording(length))
+            start, end = 0, 0
+            if bounds:
+                start = max(0, bounds[0] - self.committed_offset)
+                end = max(start, bounds[1] - self.committed_offset)
+            self.dropped += len(audio) - (end - start)
+            audio = audio[start:end]
+        if len(audio) > 0:
+            for s in self._decode(audio):
+                self.committed_text.append(s.text)
+        return "".join(self.committed_text), self.info
+
+    def dropped_seconds(self) -> float:
+        return self.dropped / self.buffer.sample_rate
@@ -0,0 +1,241 @@
+import json
+import logging
+import threading
+import time
+import urllib.request
+
+from history import estimate_tokens
+
+logging.basicConfig(
+    format='%(asctime)s [%(levelname)s] %(filename)s:%(funcName)s: %(message)s',
+    level=logging.DEBUG,
+    handlers=[
+        logging.StreamHandler()  # Output logs to stdout
+    ]
+)
+
+STARTING = 'starting'
+READY = 'ready'
+FAILED = 'failed'
+
+class LLMBackendError(Exception):
+    """A request to the LLM failed (connection lost, API error, blocked reply, ...)."""
+
+class LLMBackend:
+    """
+    Where the replies come from. The turn engine (`LlamaPiBase.llm`) only needs `start`,
+    `stream` and `close`, and does the rest the same way for every backend: sentence
+    segmentation, speaking while the reply streams, the `$command` and the history.
+
+    `start(on_state)` may return before the backend is ready, and reports 'starting',
+    'ready' or 'failed' through `on_state` (from any thread).
+    `stream(messages)` yields the reply text as it is generated, and raises
+    `LLMBackendError` if the request fails.
+    `count_tokens(text)` counts with the model's tokenizer where there is one (an estimate otherwise).
+    """
+    # The service keeps the conversation itself, `stream` only sends the last message.
+    keeps_history = False
+    # Run a throwaway request once ready, so the first real turn doesn't pay for the prefill.
+    needs_warmup = False
+
+    def start(self, on_state):
+        on_state(READY)
+
+    def stream(self, messages):
+        raise NotImplementedError
+
+    def count_tokens(self, text: str) -> int:
+        return estimate_tokens(text)
+
+    def close(self):
+        pass
+
+class LocalServerBackend(LLMBackend):
+    """`llama_cpp.server` managed by `LlamaServer`, through its OpenAI-compatible API."""
+    needs_warmup = True
+
+    def __init__(self, config_file: str = 'server_config.json', port: int = 8000, command=None):
+        self.config_file = config_file
+        self.port = port
+        self.command = command
+        self.client = None
+        self.server = None
+
+    def start(self, on_state):
+        from openai import OpenAI
+        from llm_server import LlamaServer
+
+        self.client = OpenAI(
+            base_url=f"http://127.0.0.1:{self.port}/v1",
+            api_key = "sk-no-key-required"
+        )
+        # Doesn't block: the server is launched and probed in the background.
+        self.server = LlamaServer(self.config_file, port=self.port, command=self.command, on_state=on_state)
+        self.server.start()
+
+    def stream(self, messages):
+        from openai import APIError
+
+        try:
+            completion = self.client.chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages = messages,
+                stream=True,
+                # temperature = 0.6,
+            )
+            for chunk in completion:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except APIError as e:
+            raise LLMBackendError(str(e)) from e
+
+    def count_tokens(self, text):
+        # The server's tokenizer endpoint, so the count is the model's.
+        request = urllib.request.Request(
+            f"http://127.0.0.1:{self.port}/extras/tokenize",
+            data=json.dumps({"input": text, "model": "gpt-3.5-turbo"}).encode(),
+            headers={"Content-Type": "application/json"},
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=2) as r:
+                return len(json.load(r)["tokens"])
+        except (OSError, ValueError, KeyError) as e:
+            logging.debug(f"Tokenizer not available ({e}), estimating")
+            return estimate_tokens(text)
+
+    def close(self):
+        if self.server:
+            logging.info("stopping the LLM server")
+            self.server.stop()
+
+class InProcessBackend(LLMBackend):
+    """llama-cpp-python in this process (`LocalLlama`), with the system prompt KV state cached."""
+    needs_warmup = True
+
+    def __init__(self, config_file: str = 'server_config.json', system_msg: dict = None):
+        self.config_file = config_file
+        self.system_msg = system_msg
+        self.local_llama = None
+
+    def start(self, on_state):
+        on_state(STARTING)
+        threading.Thread(target=self._load, args=(on_state,), daemon=True).start()
+
+    def _load(self, on_state):
+        from local_llama import LocalLlama
+
+        try:
+            self.local_llama = LocalLlama(self.config_file)
+            self.local_llama.load()
+            if self.system_msg:
+                self.local_llama.prime(self.system_msg)
+        except Exception as e:
+            logging.error(f"Failed to load the model: {e}")
+            on_state(FAILED)
+            return
+        on_state(READY)
+
+    def stream(self, messages):
+        yield from self.local_llama.stream(messages)
+
+    def count_tokens(self, text):
+        if self.local_llama is None or self.local_llama.llama is None:
+            return estimate_tokens(text)
+        return len(self.local_llama.tokenize(text))
+
+class CozeBackend(LLMBackend):
+    """A Coze bot. The system prompt is configured on the bot, Coze keeps the conversation."""
+    keeps_history = True
+
+    def __init__(self, api_key: str, bot_id: str, base_url: str = "https://api.coze.com/v3",
+                 user_id: str = '12345678', streaming: bool = True):
+        from cozewrapper import CozeBotWrapper
+
+        self.bot = CozeBotWrapper(api_key, bot_id=bot_id, user_id=user_id, base_url=base_url)
+        # Otherwise wait for the whole reply (sleep and poll).
+        self.streaming = streaming
+
+    def stream(self, messages):
+        from cozewrapper import CozeBotException
+
+        request = messages[-1]["content"]
+        try:
+            if self.streaming:
+                yield from self.bot.chat_stream(request)
+            else:
+                resp = self.bot.chat(request)
+                if resp:
+                    yield resp
+        except CozeBotException as e:
+            raise LLMBackendError(str(e)) from e
+
+    def close(self):
+        self.bot.close()
+
+class GeminiBackend(LLMBackend):
+    """A Gemini chat session, with our system prompt as the system instruction."""
+    keeps_history = True
+
+    def __init__(self, api_key: str, system_inst: str, streaming: bool = True, client=None):
+        from gemini import GeminiWrapper
+
+        self.bot = GeminiWrapper(api_key=api_key, client=client)
+        self.system_inst = system_inst
+        # Otherwise wait for the whole reply.
+        self.streaming = streaming
+
+    def start(self, on_state):
+        self.bot.new_chat_session(system_inst=self.system_inst)
+        on_state(READY)
+
+    def stream(self, messages):
+        request = messages[-1]["content"]
+        try:
+            if self.streaming:
+                yield from self.bot.chat_stream(request)
+            else:
+                yield self.bot.chat(request)
+        except Exception as e:
+            # google.api_core errors, blocked prompts, ...
+            raise LLMBackendError(str(e)) from e
+
+class FakeBackend(LLMBackend):
+    """
+    Canned replies (with a `$command`) streamed word by word at `token_time` per token,
+    for running the pipeline in tests and benchmarks without a model or an API key.
+    tools/llm_stub.py and tools/coze_stub.py answer with the same replies.
+    """
+    REPLIES = [
+        ("hello", "Hello there! I'm Skyler, nice to meet you. $greet"),
+        ("hand", "Sure, here you go. Let me hand it over to you. $retrieve"),
+        ("sad", "I'm sorry to hear that. Things will get better, I promise. $pat"),
+        ("happy", "That's wonderful news! I'm so happy for you. $smile"),
+    ]
+    DEFAULT_REPLY = "I'm Skyler, your voice assistant. How can I help you today? $idle"
+
+    def __init__(self, first_token_time: float = 0.0, token_time: float = 0.0, load_time: float = 0.0):
+        self.first_token_time = first_token_time
+        self.token_time = token_time
+        self.load_time = load_time
+        self.requests = []
+
+    def start(self, on_state):
+        if not self.load_time:
+            on_state(READY)
+            return
+        on_state(STARTING)
+        threading.Timer(self.load_time, on_state, args=(READY,)).start()
+
+    def reply(self, request):
+        for keyword, reply in self.REPLIES:
+            if keyword in request.lower():
+                return reply
+        return self.DEFAULT_REPLY
+
+    def stream(self, messages):
+        request = messages[-1]["content"]
+        self.requests.append(request)
+        time.sleep(self.first_token_time)
+        for i, word in enumerate(self.reply(request).split(" ")):
+            time.sleep(self.token_time)
+            yield word if i == 0 else " " + word
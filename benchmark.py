@@ -0,0 +1,890 @@
+"""
+Benchmarks for the LlamaPi voice pipeline.
+
+Usage:
+    python benchmark.py asr --fixtures fixtures/
+    python benchmark.py streaming-asr --fixtures fixtures/
+    python benchmark.py asr-sweep --fixtures fixtures/ --compute-types int8,int8_float32 --threads 2,4
+    python benchmark.py tts [--stub]
+    python benchmark.py segmenter
+    python benchmark.py server [--stub] [--crash]
+    python benchmark.py prefill [--inprocess]
+    python benchmark.py coze [--url https://api.coze.com/v3]
+    python benchmark.py coze-overhead
+    python benchmark.py gemini [--sentences 1 3 5]
+    python benchmark.py e2e --fixtures fixtures/ [--stub-tts] --output e2e.json
+    python benchmark.py motion [--gestures greet retrieve] [--no-auto-increment]
+    python benchmark.py response-cache
+
+Fixtures are 16 kHz, 16-bit mono WAV recordings (e.g. saved with `DEBUG_SAVE_WAV`).
+For word error rates, put the reference transcript of `foo.wav` in `foo.txt`.
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+logging.basicConfig(
+    format='%(asctime)s [%(levelname)s] %(filename)s:%(funcName)s: %(message)s',
+    level=logging.INFO,
+    handlers=[
+        logging.StreamHandler()  # Output logs to stdout
+    ]
+)
+
+def load_fixtures(fixtures_dir):
+    files = sorted(glob.glob(os.path.join(fixtures_dir, "*.wav")))
+    if not files:
+        raise SystemExit(f"No WAV fixtures found in {fixtures_dir}")
+    return files
+
+def summarize(samples):
+    samples = sorted(samples)
+    if not samples:
+        return {}
+    def pct(p):
+        return samples[min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))]
+    return {
+        "n": len(samples),
+        "mean": statistics.mean(samples),
+        "p50": pct(50),
+        "p90": pct(90),
+        "p99": pct(99),
+        "max": samples[-1],
+    }
+
+def report(results, output=None):
+    print(json.dumps(results, indent=2))
+    if output:
+        with open(output, 'w') as f:
+            json.dump(results, f, indent=2)
+        logging.info(f"Results written to {output}")
+
+def asr_model(args):
+    """The Whisper model and transcribe options the app would use, `--model`/`--beam-size` on top."""
+    from asr import load_asr_config, load_whisper_model, transcribe_options
+
+    overrides = {"model": args.model, "beam_size": args.beam_size}
+    config = load_asr_config(args.config, **{k: v for k, v in overrides.items() if v is not None})
+    return load_whisper_model(config), transcribe_options(config)
+
+def bench_asr(args):
+    """Time-to-transcript via the old temp.wav path vs the in-memory buffer."""
+    from asr import AudioBuffer, read_wav_chunks, write_wav
+
+    model, options = asr_model(args)
+    tmpdir = tempfile.mkdtemp()
+    temp_wav = os.path.join(tmpdir, "temp.wav")
+    timings = {"wav_file": [], "in_memory": []}
+
+    for fixture in load_fixtures(args.fixtures):
+        chunks, sample_rate = read_wav_chunks(fixture)
+        for _ in range(args.repeat):
+            # Old path: join chunks into a WAV on disk, let faster_whisper decode it.
+            t0 = time.perf_counter()
+            write_wav(temp_wav, chunks, sample_rate=sample_rate)
+            segments, _ = model.transcribe(temp_wav, **options)
+            text_file = "".join(s.text for s in segments)
+            timings["wav_file"].append(time.perf_counter() - t0)
+
+            # New path: the chunks are converted while recording, so only the
+            # append cost of the last chunk is on the critical path.
+            buf = AudioBuffer(sample_rate)
+            for c in chunks:
+                buf.append(c)
+            t0 = time.perf_counter()
+            segments, _ = model.transcribe(buf.view(), **options)
+            text_mem = "".join(s.text for s in segments)
+            timings["in_memory"].append(time.perf_counter() - t0)
+
+            if text_file != text_mem:
+                logging.warning(f"{fixture}: transcripts differ:\n  {text_file}\n  {text_mem}")
+
+    report({name: summarize(t) for name, t in timings.items()}, args.output)
+
+def normalize_words(text):
+    return re.sub(r"[^\w\s']", " ", text.lower()).split()
+
+def word_errors(reference, hypothesis):
+    """Word-level edit distance (substitutions + deletions + insertions)."""
+    ref, hyp = normalize_words(reference), normalize_words(hypothesis)
+    row = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        prev, row[0] = row[0], i
+        for j, h in enumerate(hyp, 1):
+            prev, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, prev + (r != h))
+    return row[-1], len(ref)
+
+def bench_asr_sweep(args):
+    """Real-time factor vs word error rate over a grid of Whisper settings."""
+    import itertools
+    from asr import load_asr_config, load_whisper_model, pcm16_to_float32, read_wav_chunks
+
+    fixtures = []
+    for fixture in load_fixtures(args.fixtures):
+        chunks, sample_rate = read_wav_chunks(fixture)
+        audio = pcm16_to_float32(chunks)
+        reference_file = os.path.splitext(fixture)[0] + ".txt"
+        reference = None
+        if os.path.exists(reference_file):
+            with open(reference_file) as f:
+                reference = f.read()
+        fixtures.append((os.path.basename(fixture), audio, len(audio) / sample_rate, reference))
+    if not any(f[3] for f in fixtures):
+        logging.warning("No reference transcripts (.txt next to the .wav), WER is not measured")
+
+    base = load_asr_config(args.config)
+    def values(arg, key, cast=str):
+        return [cast(v) for v in arg.split(",")] if arg else [base[key]]
+
+    results = []
+    for model_name, compute_type, threads in itertools.product(
+            values(args.models, "model"), values(args.compute_types, "compute_type"),
+            values(args.threads, "cpu_threads", int)):
+        config = dict(base, model=model_name, compute_type=compute_type, cpu_threads=threads)
+        t0 = time.perf_counter()
+        model = load_whisper_model(config)
+        load_time = time.perf_counter() - t0
+        language = None if args.detect_language else config["language"]
+        # Warm up, the first decode is slower.
+        list(model.transcribe(fixtures[0][1], beam_size=1, language=language)[0])
+
+        for beam_size in values(args.beam_sizes, "beam_size", int):
+            decode_time = audio_time = 0.0
+            errors = words = 0
+            for name, audio, duration, reference in fixtures:
+                t0 = time.perf_counter()
+                segments, _ = model.transcribe(audio, beam_size=beam_size, language=language)
+                text = "".join(s.text for s in segments)
+                decode_time += time.perf_counter() - t0
+                audio_time += duration
+                if reference:
+                    e, n = word_errors(reference, text)
+                    errors += e
+                    words += n
+            result = {
+                "model": model_name, "compute_type": compute_type, "cpu_threads": threads,
+                "beam_size": beam_size, "language": language, "load_time": load_time,
+                "rtf": decode_time / audio_time, "wer": errors / words if words else None,
+            }
+            logging.info(f"{model_name} {compute_type} threads={threads} beam={beam_size}: "
+                         f"RTF {result['rtf']:.3f}, WER {result['wer']}")
+            results.append(result)
+        del model
+
+    results.sort(key=lambda r: r["rtf"])
+    print(f"{'model':<12}{'compute_type':<16}{'threads':>8}{'beam':>6}{'RTF':>8}{'WER':>8}")
+    for r in results:
+        wer = f"{r['wer']:.3f}" if r["wer"] is not None else "-"
+        print(f"{r['model']:<12}{r['compute_type']:<16}{r['cpu_threads']:>8}{r['beam_size']:>6}{r['rtf']:>8.3f}{wer:>8}")
+    report({"fixtures": [f[0] for f in fixtures], "results": results}, args.output)
+
+def bench_streaming_asr(args):
+    """Release-to-transcript latency: batch decode after release vs streaming ASR."""
+    from asr import AudioBuffer, StreamingTranscriber, read_wav_chunks
+
+    model, options = asr_model(args)
+    timings = {"batch": [], "streaming": []}
+    per_fixture = {}
+
+    for fixture in load_fixtures(args.fixtures):
+        chunks, sample_rate = read_wav_chunks(fixture)
+        chunk_duration = len(chunks[0]) / 2 / sample_rate
+        buf = AudioBuffer(sample_rate)
+        for c in chunks:
+            buf.append(c)
+
+        # Batch: nothing happens until the button is released.
+        t0 = time.perf_counter()
+        segments, _ = model.transcribe(buf.view(), **options)
+        batch_text = "".join(s.text for s in segments)
+        batch = time.perf_counter() - t0
+
+        # Streaming: feed the chunks in real time, as `record_audio` would.
+        transcriber = StreamingTranscriber(model, AudioBuffer(sample_rate), interval=args.interval, **options)
+        transcriber.start()
+        start = time.perf_counter()
+        for i, c in enumerate(chunks):
+            transcriber.feed(c)
+            delay = start + (i + 1) * chunk_duration - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        t0 = time.perf_counter()
+        streaming_text, _ = transcriber.finish()
+        streaming = time.perf_counter() - t0
+
+        timings["batch"].append(batch)
+        timings["streaming"].append(streaming)
+        per_fixture[os.path.basename(fixture)] = {
+            "duration": buf.duration(),
+            "batch": batch,
+            "streaming": streaming,
+            "decodes": transcriber.num_decodes,
+            "batch_text": batch_text,
+            "streaming_text": streaming_text,
+        }
+
+    results = {name: summarize(t) for name, t in timings.items()}
+    results["fixtures"] = per_fixture
+    report(results, args.output)
+
+SENTENCES = [
+    "Hello there, I'm Skyler.",
+    "It's nice to meet you!",
+    "I can help you with work, life and entertainment.",
+    "My robot arm can also hand things over to you.",
+    "Just hold the button and talk to me.",
+]
+
+def piper_command(args):
+    return tool_command('piper_stub.py') if args.stub else [args.piper]
+
+def bench_tts(args):
+    """Per-sentence time-to-first-audio: piper process per sentence vs the TTS service."""
+    from tts import TTSService
+
+    timings = {"process_per_sentence": [], "service": []}
+
+    # Old path: a new piper process (and voice model load) for every sentence.
+    for _ in range(args.repeat):
+        for text in SENTENCES:
+            t0 = time.perf_counter()
+            p = subprocess.Popen(piper_command(args) + ['-m', args.voice, '--output-raw'],
+                                 stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+            p.stdin.write(text.encode('utf-8'))
+            p.stdin.close()
+            p.stdout.read(1)
+            timings["process_per_sentence"].append(time.perf_counter() - t0)
+            p.stdout.read()
+            p.wait()
+
+    # New path: voice loaded and warmed up once, sentences go through the queue.
+    t0 = time.perf_counter()
+    service = TTSService({'en': args.voice}, piper_command(args), player='aplay' if args.play else None)
+    service.start(warmup=True)
+    startup = time.perf_counter() - t0
+    for _ in range(args.repeat):
+        for text in SENTENCES:
+            utt = service.speak(text, 'en', block=False)
+            utt.synthesized.wait()
+            timings["service"].append(utt.time_to_first_audio())
+            utt.wait()
+    service.close()
+
+    results = {name: summarize(t) for name, t in timings.items()}
+    results["service_startup"] = startup
+    report(results, args.output)
+
+def bench_segmenter(args):
+    """Per-reply segmentation cost: re-splitting the whole response per token vs SentenceSegmenter."""
+    from segmenter import SentenceSegmenter, split_into_sentences
+
+    results = {}
+    for num_sentences in args.sentences:
+        reply = " ".join(SENTENCES[i % len(SENTENCES)] for i in range(num_sentences)) + " $greet"
+        # Roughly what llama.cpp streams: a few characters per token.
+        tokens = [reply[i:i + 4] for i in range(0, len(reply), 4)]
+
+        t0 = time.perf_counter()
+        resp = ""
+        for tok in tokens:
+            resp += tok
+            split_into_sentences(resp)
+        resplit = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        segmenter = SentenceSegmenter()
+        for tok in tokens:
+            segmenter.feed(tok)
+        segmenter.flush()
+        incremental = time.perf_counter() - t0
+
+        results[f"{num_sentences}_sentences"] = {
+            "tokens": len(tokens),
+            "resplit": resplit,
+            "incremental": incremental,
+            "speedup": resplit / incremental,
+        }
+    report(results, args.output)
+
+def tool_command(name):
+    return [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tools', name)]
+
+def stream_chat(base_url, messages, model="gpt-3.5-turbo"):
+    """Minimal streaming chat completion client. Returns (time to first token, total time, reply)."""
+    body = json.dumps({"model": model, "messages": messages, "stream": True}).encode()
+    request = urllib.request.Request(base_url + "/v1/chat/completions", data=body,
+                                     headers={"Content-Type": "application/json"})
+    t0 = time.perf_counter()
+    ttft = None
+    reply = ""
+    with urllib.request.urlopen(request, timeout=300) as response:
+        for line in response:
+            line = line.decode().strip()
+            if not line.startswith("data:") or line == "data: [DONE]":
+                continue
+            content = json.loads(line[5:])["choices"][0]["delta"].get("content")
+            if content:
+                if ttft is None:
+                    ttft = time.perf_counter() - t0
+                reply += content
+    return ttft, time.perf_counter() - t0, reply
+
+def bench_server(args):
+    """Cold start to first answer with the managed LLM server, and recovery after a crash."""
+    from llm_server import LlamaServer
+
+    command = None
+    if args.stub:
+        command = tool_command('llm_stub.py') + ['--port', str(args.port), '--load-time', str(args.stub_load_time)]
+    server = LlamaServer(args.config, port=args.port, command=command)
+    messages = [{"role": "user", "content": "what is your name?"}]
+
+    t0 = time.perf_counter()
+    server.start()
+    start_returned = time.perf_counter() - t0
+    if not server.wait_ready(args.timeout):
+        server.stop()
+        raise SystemExit("LLM server did not become ready")
+    ready = time.perf_counter() - t0
+    ttft, total, _ = stream_chat(server.base_url, messages)
+    results = {
+        "start_returned": start_returned,
+        "ready": ready,
+        "first_token": ready + ttft,
+        "first_answer": ready + total,
+    }
+
+    if args.crash and server.process:
+        # Kill the server and time how long it takes to be back.
+        t0 = time.perf_counter()
+        server.process.kill()
+        while server.state == LlamaServer.READY:
+            time.sleep(0.05)
+        if server.wait_ready(args.timeout):
+            results["restart_ready"] = time.perf_counter() - t0
+    server.stop()
+    report(results, args.output)
+
+CONVERSATION = [
+    "Hello, who are you?",
+    "What can you do with your robot arm?",
+    "I just got a promotion at work!",
+    "Can you hand me that cup?",
+    "I'm feeling a bit tired today.",
+    "Tell me a short joke.",
+]
+
+def start_tool(name, port, *tool_args, timeout=10.0):
+    """Run one of the stand-ins in tools/ and wait until it listens on `port`."""
+    from llm_server import is_port_in_use
+
+    process = subprocess.Popen(tool_command(name) + ['--port', str(port)] + list(tool_args))
+    deadline = time.time() + timeout
+    while not is_port_in_use(port):
+        if process.poll() is not None or time.time() > deadline:
+            process.kill()
+            raise SystemExit(f"{name} did not start")
+        time.sleep(0.05)
+    return process
+
+def bench_coze(args):
+    """Coze turn latency: sleep-and-poll vs the streamed chat (first token and whole answer)."""
+    from cozewrapper import CozeBotWrapper
+
+    stub = None
+    url = args.url
+    if not url:
+        stub = start_tool('coze_stub.py', args.port, '--token-time', str(args.token_time))
+        url = f"http://127.0.0.1:{args.port}/v3"
+    api_key = os.environ.get("COZE_APIKEY", "stub")
+    bot_id = os.environ.get("COZE_BOTID", "stub")
+    timings = {"poll_answer": [], "stream_first_token": [], "stream_answer": []}
+    try:
+        for mode in ("poll", "stream"):
+            bot = CozeBotWrapper(api_key, bot_id=bot_id, user_id='12345678', base_url=url)
+            for request in CONVERSATION[:args.turns]:
+                t0 = time.perf_counter()
+                if mode == "poll":
+                    bot.chat(request)
+                else:
+                    first_token = None
+                    for _ in bot.chat_stream(request):
+                        first_token = first_token or time.perf_counter() - t0
+                    timings["stream_first_token"].append(first_token)
+                timings[f"{mode}_answer"].append(time.perf_counter() - t0)
+    finally:
+        if stub:
+            stub.terminate()
+    report({name: summarize(t) for name, t in timings.items()}, args.output)
+
+def bench_coze_overhead(args):
+    """Per-turn HTTPS request overhead of the Coze wrapper: a new connection per request vs the pooled session."""
+    import requests
+    from cozewrapper import CozeBotWrapper, CozeBotException
+
+    class UnpooledCozeBot(CozeBotWrapper):
+        # What `_send_request` used to do: module level requests, a new TCP + TLS connection every time.
+        def _send_request(self, query=None, data=None, method='POST'):
+            url = self.api_endpoint + query if query else self.api_endpoint
+            headers = {'Authorization': f'Bearer {self.api_key}', 'Content-Type': 'application/json'}
+            try:
+                response = requests.post(url, json=data, headers=headers, timeout=10, verify=self.session.verify)
+                response.raise_for_status()
+                return response.json()
+            except requests.exceptions.RequestException as e:
+                raise CozeBotException(f"An error occurred: {e}") from e
+
+    tmpdir = tempfile.mkdtemp()
+    certfile, keyfile = os.path.join(tmpdir, "cert.pem"), os.path.join(tmpdir, "key.pem")
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                    "-subj", "/CN=localhost", "-addext", "subjectAltName=IP:127.0.0.1",
+                    "-keyout", keyfile, "-out", certfile], check=True, capture_output=True)
+    stub = start_tool('coze_stub.py', args.port, '--certfile', certfile, '--keyfile', keyfile,
+                      '--first-token-time', '0', '--token-time', '0', '--latency', str(args.latency))
+    url = f"https://127.0.0.1:{args.port}/v3"
+    results = {}
+    try:
+        for name, cls in (("unpooled", UnpooledCozeBot), ("pooled", CozeBotWrapper)):
+            bot = cls("stub", bot_id="stub", user_id='12345678', base_url=url)
+            bot.session.verify = certfile
+            # Otherwise REQUESTS_CA_BUNDLE wins over `session.verify`.
+            bot.session.trust_env = False
+            turns = []
+            for request in CONVERSATION[:args.turns]:
+                # The requests of a polled turn, without the sleeps in between.
+                t0 = time.perf_counter()
+                conversation_id, chat_id = bot.start_chat(
+                    [{"role": "user", "content": request, "content_type": "text"}], bot.conversation_id)
+                bot.conversation_id = conversation_id
+                for _ in range(args.polls):
+                    bot.chat_status(conversation_id, chat_id)
+                bot.get_messages(conversation_id, chat_id)
+                turns.append(time.perf_counter() - t0)
+            bot.close()
+            results[name] = summarize(turns)
+            results[name]["requests_per_turn"] = args.polls + 2
+    finally:
+        stub.terminate()
+    report(results, args.output)
+
+def bench_prefill(args):
+    """Prefill time (time to first token) per turn of a scripted conversation, with and without prefix caching."""
+    from LlamaPi import LlamaPiBase
+    system_msg = LlamaPiBase().system_msg
+
+    def run(stream):
+        history = []
+        times = []
+        for request in CONVERSATION:
+            messages = [system_msg] + history + [{"role": "user", "content": request}]
+            t0 = time.perf_counter()
+            ttft = None
+            reply = ""
+            for txt in stream(messages):
+                if ttft is None:
+                    ttft = time.perf_counter() - t0
+                reply += txt or ""
+            times.append(ttft)
+            history += [{"role": "user", "content": request}, {"role": "assistant", "content": reply}]
+            # Same as LlamaPi.llm: keep 2 rounds.
+            history = history[-4:]
+        return times
+
+    results = {}
+    if args.inprocess:
+        from local_llama import LocalLlama
+        for use_cache in (False, True):
+            llama = LocalLlama(args.config, use_cache=use_cache)
+            llama.load()
+            if use_cache:
+                llama.prime(system_msg)
+            results["cache" if use_cache else "no_cache"] = run(llama.stream)
+            del llama
+    else:
+        # Warm up the server the way LlamaPi does, then time each turn.
+        stream_chat(args.url, [system_msg, {"role": "user", "content": "what is your name?"}])
+        results["server_ttft"] = []
+        history = []
+        for request in CONVERSATION:
+            messages = [system_msg] + history + [{"role": "user", "content": request}]
+            ttft, _, reply = stream_chat(args.url, messages)
+            results["server_ttft"].append(ttft)
+            history = (history + [{"role": "user", "content": request}, {"role": "assistant", "content": reply}])[-4:]
+    for name in list(results):
+        results[name + "_summary"] = summarize(results[name])
+    report(results, args.output)
+
+class FakeRobotArm:
+    """Stands in for `RobotArm`, every gesture just takes `gesture_time` seconds (unless cancelled)."""
+    GESTURES = {"greet": "greet", "smile": "smile", "pat": "pat", "retrieve": "retrieve", "idle": None}
+
+    def __init__(self, gesture_time=0.0):
+        self.gesture_time = gesture_time
+        self.cancelled = threading.Event()
+
+    def perform(self, name, cancelled=None):
+        self.cancelled = cancelled or threading.Event()
+        if self.GESTURES[name]:
+            self.cancelled.wait(self.gesture_time)
+
+    def cancel(self):
+        self.cancelled.set()
+
+def bench_gemini(args):
+    """Gemini time-to-first-audio by reply length: whole reply vs streamed sentence by sentence."""
+    from backends import GeminiBackend
+    from tts import TTSService
+    from LlamaPi_gemini import LlamaPiGemini
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tools'))
+    from genai_stub import FakeGenAI
+
+    class BenchLlamaPiGemini(LlamaPiGemini):
+        def speak_back(self, text, lang=None, block=True):
+            utt = super().speak_back(text, lang, block)
+            if self.first_utterance is None:
+                self.first_utterance = utt
+            return utt
+
+    app = BenchLlamaPiGemini()
+    app.tts = TTSService({'en': 'stub.onnx'}, tool_command('piper_stub.py'), player=None)
+    app.tts.start(warmup=True)
+    results = {}
+    for num_sentences in args.sentences:
+        reply = " ".join(SENTENCES[i % len(SENTENCES)] for i in range(num_sentences)) + " $greet"
+        client = FakeGenAI(reply, args.first_token_time, args.token_time)
+        for streaming in (False, True):
+            app.backend = GeminiBackend("fake", app.system_msg["content"], streaming=streaming, client=client)
+            app.backend.start(app.on_backend_state)
+            first_audio, total = [], []
+            for _ in range(args.repeat):
+                app.first_utterance = None
+                t0 = time.monotonic()
+                app.llm(CONVERSATION[0])
+                total.append(time.monotonic() - t0)
+                first_audio.append(app.first_utterance.first_audio - t0)
+            name = f"{num_sentences}_sentences_{'stream' if streaming else 'whole'}"
+            results[name] = {"first_audio": summarize(first_audio), "total": summarize(total)}
+    app.tts.close()
+    report(results, args.output)
+
+def bench_response_cache(args):
+    """
+    Turn latency with the response cache (fake LLM, stub piper): the first time a request
+    is heard, heard again, and heard again after a restart (cache reloaded from disk).
+    Every request starts a new conversation, like a new visitor at a kiosk.
+    """
+    from backends import FakeBackend
+    from tts import TTSService
+    from LlamaPi_local import LlamaPi
+
+    class BenchLlamaPi(LlamaPi):
+        def create_backend(self):
+            return FakeBackend(args.first_token_time, args.token_time)
+
+        def on_speech(self, utt):
+            if self.first_audio is None:
+                self.first_audio = utt.first_audio
+
+    def start_app(cache_file):
+        app = BenchLlamaPi()
+        app.RESPONSE_CACHE = True
+        app.RESPONSE_CACHE_FILE = cache_file
+        app.first_audio = None
+        app.tts = TTSService({'en': 'stub.onnx'}, tool_command('piper_stub.py'), player=None,
+                             on_done=app.on_speech, keep_audio=True)
+        app.tts.start(warmup=True)
+        app.prepare_llm()
+        return app
+
+    requests = ["Hello!", "Can you hand me that cup?", "I'm so happy today.", "What's your name?"]
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_file = os.path.join(tmp, "response_cache.db")
+        app = start_app(cache_file)
+        for name in ("miss", "hit", "restart"):
+            if name == "restart":
+                app.tts.close()
+                app.response_cache.close()
+                app = start_app(cache_file)
+            first_audio, total = [], []
+            for request in requests:
+                # Variations of the same request still hit.
+                request = request.lower() if name != "miss" else request
+                app.history.clear()
+                app.first_audio = None
+                t0 = time.monotonic()
+                app.respond(request)
+                total.append(time.monotonic() - t0)
+                first_audio.append(app.first_audio - t0)
+            results[name] = {"first_audio": summarize(first_audio), "total": summarize(total)}
+        results["cached_replies"] = len(app.response_cache)
+        results["cache_file_bytes"] = os.path.getsize(cache_file)
+        app.tts.close()
+        app.response_cache.close()
+    report(results, args.output)
+
+def bench_e2e(args):
+    """
+    Plays WAV fixtures through the whole pipeline (ASR, LLM, TTS, robot arm) without
+    audio devices, a display or a real model, and reports per-stage latency percentiles.
+
+    Stage times are measured from the moment the button is released:
+    asr (transcript ready), ttft (first LLM token), first_audio (first TTS audio),
+    command (`$command` streamed, the gesture starts), llm (reply generated and spoken)
+    and total (speech and robot gesture done).
+    """
+    from asr import read_wav_chunks
+    from backends import FakeBackend
+    from tts import TTSService
+    from LlamaPi_local import LlamaPi
+
+    class BenchLlamaPi(LlamaPi):
+        def reset_marks(self):
+            self.marks = {}
+            self.first_utterance = None
+
+        def mark(self, name):
+            self.marks.setdefault(name, time.monotonic())
+
+        def transcribe_audio(self):
+            transcript = super().transcribe_audio()
+            self.mark("asr")
+            return transcript
+
+        def stream_reply(self, messages):
+            for txt in super().stream_reply(messages):
+                self.mark("ttft")
+                yield txt
+
+        def create_backend(self):
+            if args.fake_llm:
+                return FakeBackend(token_time=args.token_time)
+            return super().create_backend()
+
+        def speak_back(self, text, lang=None, block=True):
+            utt = super().speak_back(text, lang, block)
+            if self.first_utterance is None:
+                self.first_utterance = utt
+            return utt
+
+        def dispatch_command(self, cmd):
+            self.mark("command")
+            super().dispatch_command(cmd)
+
+        def llm(self, request, warmup=False):
+            cmd = super().llm(request, warmup)
+            self.mark("llm")
+            return cmd
+
+    app = BenchLlamaPi()
+    app.reset_marks()
+    app.init_audio()
+    app.llm_server_command = tool_command('llm_stub.py') + [
+        '--port', str(args.port), '--load-time', '0', '--token-time', str(args.token_time)]
+    app.LLM_PORT = args.port
+    app.tts = TTSService(app.TTS_VOICES if not args.stub_tts else {'en': 'stub.onnx', 'zh': 'stub.onnx'},
+                         tool_command('piper_stub.py') if args.stub_tts else app.PIPER_BIN, player=None)
+    app.tts.start(warmup=True)
+    app.robot_arm = FakeRobotArm(args.gesture_time)
+    app.MOTION_POLICY = args.motion_policy
+    app.init_motion()
+    app.prepare_llm()
+    while not app.llm_ready:
+        time.sleep(0.1)
+
+    stages = {name: [] for name in ("asr", "ttft", "first_audio", "command", "llm", "total")}
+    per_turn = []
+    for fixture in load_fixtures(args.fixtures):
+        chunks, sample_rate = read_wav_chunks(fixture)
+        chunk_duration = len(chunks[0]) / 2 / sample_rate
+        for _ in range(args.repeat):
+            app.reset_marks()
+            # Press the button and "talk".
+            app.begin_capture()
+            start = time.monotonic()
+            for i, c in enumerate(chunks):
+                app.capture_chunk(c)
+                delay = start + (i + 1) * chunk_duration - time.monotonic()
+                if args.realtime and delay > 0:
+                    time.sleep(delay)
+            # Release.
+            t0 = time.monotonic()
+            app.process_recording()
+            app.mark("total")
+            utt = app.first_utterance
+            if utt and utt.first_audio:
+                app.marks["first_audio"] = utt.first_audio
+            turn = {name: app.marks[name] - t0 for name in stages if name in app.marks}
+            turn["fixture"] = os.path.basename(fixture)
+            per_turn.append(turn)
+            for name in stages:
+                if name in turn:
+                    stages[name].append(turn[name])
+
+    app.backend.close()
+    app.motion.close()
+    app.tts.close()
+    results = {name: summarize(t) for name, t in stages.items()}
+    results["turns"] = per_turn
+    report(results, args.output)
+
+def bench_motion(args):
+    """
+    Plays the robot arm gestures on a simulated PCA9685 through `MotionController`:
+    how long `dispatch` blocks the caller, the gesture time, the servo writes, the I2C
+    transactions (and their time on a 100 kHz bus), and how long the arm takes to get
+    home after `cancel`.
+    """
+    from motion import MotionController
+    from PCA9685 import SimulatedPCA9685
+    from robot_arm import RobotArm
+
+    pwm = SimulatedPCA9685(record=True, auto_increment=not args.no_auto_increment)
+    arm = RobotArm(pwm=pwm)
+    done = []
+    motion = MotionController(arm, on_done=lambda name, start, end: done.append(end))
+    results = {}
+    for name in args.gestures:
+        pwm.log.clear()
+        transactions, bus_time = pwm.bus.transactions, pwm.bus.bus_time()
+        t0 = time.monotonic()
+        motion.dispatch(name)
+        dispatch_time = time.monotonic() - t0
+        motion.wait()
+        results[name] = {
+            "dispatch_ms": dispatch_time * 1000,
+            "gesture_time": done[-1] - t0,
+            "servo_writes": len(pwm.log),
+            "channels": len({ch for _, ch, _ in pwm.log}),
+            "i2c_transactions": pwm.bus.transactions - transactions,
+            "i2c_ms": (pwm.bus.bus_time() - bus_time) * 1000,
+        }
+    if args.cancel_after:
+        motion.dispatch("retrieve")
+        time.sleep(args.cancel_after)
+        t0 = time.monotonic()
+        motion.cancel()
+        motion.wait()
+        results["cancel_to_home"] = done[-1] - t0
+        results["home_after_cancel"] = arm.pose == arm.HOME
+    motion.close()
+    report(results, args.output)
+
+def main():
+    parser = argparse.ArgumentParser(description="LlamaPi benchmarks")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    p = subparsers.add_parser("asr", help="temp.wav vs in-memory time-to-transcript")
+    p.add_argument("--fixtures", default="fixtures")
+    p.add_argument("--config", default="asr_config.json", help="whisper settings, as the app loads them")
+    p.add_argument("--model", help="instead of the model in --config")
+    p.add_argument("--beam-size", type=int, help="instead of the beam size in --config")
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_asr)
+
+    p = subparsers.add_parser("streaming-asr", help="release-to-transcript latency, batch vs streaming")
+    p.add_argument("--fixtures", default="fixtures")
+    p.add_argument("--config", default="asr_config.json", help="whisper settings, as the app loads them")
+    p.add_argument("--model", help="instead of the model in --config")
+    p.add_argument("--beam-size", type=int, help="instead of the beam size in --config")
+    p.add_argument("--interval", type=float, default=2.0)
+    p.set_defaults(func=bench_streaming_asr)
+
+    p = subparsers.add_parser("asr-sweep", help="real-time factor vs WER over Whisper settings")
+    p.add_argument("--fixtures", default="fixtures")
+    p.add_argument("--config", default="asr_config.json", help="settings that are not swept")
+    p.add_argument("--models", help="comma separated, e.g. tiny.en,base.en")
+    p.add_argument("--compute-types", help="comma separated, e.g. int8,int8_float32,float32")
+    p.add_argument("--threads", help="comma separated cpu_threads, e.g. 1,2,4")
+    p.add_argument("--beam-sizes", help="comma separated, e.g. 1,2,5")
+    p.add_argument("--detect-language", action="store_true", help="don't pin the language")
+    p.set_defaults(func=bench_asr_sweep)
+
+    p = subparsers.add_parser("tts", help="per-sentence time-to-first-audio, piper per sentence vs TTS service")
+    p.add_argument("--piper", default="./tts/piper/piper")
+    p.add_argument("--stub", action="store_true", help="use tools/piper_stub.py instead of piper")
+    p.add_argument("--voice", default="./tts/voices/en_US-amy-medium.onnx")
+    p.add_argument("--play", action="store_true", help="play the audio with aplay")
+    p.add_argument("--repeat", type=int, default=2)
+    p.set_defaults(func=bench_tts)
+
+    p = subparsers.add_parser("segmenter", help="sentence splitting cost per streamed reply")
+    p.add_argument("--sentences", type=int, nargs="+", default=[5, 20, 100])
+    p.set_defaults(func=bench_segmenter)
+
+    p = subparsers.add_parser("server", help="LLM server cold start to first answer")
+    p.add_argument("--config", default="server_config.json")
+    p.add_argument("--port", type=int, default=8000)
+    p.add_argument("--stub", action="store_true", help="use tools/llm_stub.py instead of llama_cpp.server")
+    p.add_argument("--stub-load-time", type=float, default=2.0)
+    p.add_argument("--crash", action="store_true", help="also kill the server and time the restart")
+    p.add_argument("--timeout", type=float, default=600)
+    p.set_defaults(func=bench_server)
+
+    p = subparsers.add_parser("prefill", help="prefill time per turn, with and without prefix caching")
+    p.add_argument("--config", default="server_config.json")
+    p.add_argument("--inprocess", action="store_true", help="run llama-cpp-python in process, cache on vs off")
+    p.add_argument("--url", default="http://127.0.0.1:8000", help="LLM server to measure otherwise")
+    p.set_defaults(func=bench_prefill)
+
+    p = subparsers.add_parser("coze", help="Coze turn latency, sleep-and-poll vs streaming")
+    p.add_argument("--url", help="Coze API base URL, defaults to tools/coze_stub.py")
+    p.add_argument("--port", type=int, default=8001, help="port of the stub")
+    p.add_argument("--token-time", type=float, default=0.05, help="seconds per token of the stub")
+    p.add_argument("--turns", type=int, default=4)
+    p.set_defaults(func=bench_coze)
+
+    p = subparsers.add_parser("coze-overhead", help="per-turn Coze request overhead, new connections vs pooled session")
+    p.add_argument("--port", type=int, default=8443, help="port of the HTTPS stub")
+    p.add_argument("--turns", type=int, default=6)
+    p.add_argument("--polls", type=int, default=3, help="status requests per turn")
+    p.add_argument("--latency", type=float, default=0.0, help="server think time per request")
+    p.set_defaults(func=bench_coze_overhead)
+
+    p = subparsers.add_parser("gemini", help="Gemini time-to-first-audio, whole reply vs streaming (fake client)")
+    p.add_argument("--sentences", type=int, nargs="+", default=[1, 3, 5])
+    p.add_argument("--first-token-time", type=float, default=0.5)
+    p.add_argument("--token-time", type=float, default=0.02)
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_gemini)
+
+    p = subparsers.add_parser("response-cache", help="turn latency, first time vs repeated request (and after a restart)")
+    p.add_argument("--first-token-time", type=float, default=0.5)
+    p.add_argument("--token-time", type=float, default=0.05)
+    p.set_defaults(func=bench_response_cache)
+
+    p = subparsers.add_parser("e2e", help="end-to-end voice turn latency with stage breakdown")
+    p.add_argument("--fixtures", default="fixtures")
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--token-time", type=float, default=0.3, help="seconds per token of the stub LLM")
+    p.add_argument("--fake-llm", action="store_true", help="use the in-process FakeBackend instead of the LLM stub server")
+    p.add_argument("--stub-tts", action="store_true", help="use tools/piper_stub.py instead of piper")
+    p.add_argument("--gesture-time", type=float, default=2.0)
+    p.add_argument("--motion-policy", default="queue", choices=["queue", "cancel", "ignore"])
+    p.add_argument("--no-realtime", dest="realtime", action="store_false",
+                   help="feed the recordings as fast as possible instead of in real time")
+    p.set_defaults(func=bench_e2e)
+
+    p = subparsers.add_parser("motion", help="robot arm gestures on a simulated PCA9685")
+    p.add_argument("--gestures", nargs="+", default=["greet", "smile", "pat", "retrieve"])
+    p.add_argument("--cancel-after", type=float, default=1.5, help="cancel a retrieve after this many seconds (0: don't)")
+    p.add_argument("--no-auto-increment", action="store_true", help="one I2C transaction per PCA9685 register")
+    p.set_defaults(func=bench_motion)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,13 @@
+import json
 import logging
 from pprint import pprint
 import random
 import time
-from typing import Dict, List, Tuple
+from typing import Dict, Iterator, List, Tuple
 import urllib.parse
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 logging.basicConfig(
     format='%(asctime)s [%(levelname)s] %(filename)s:%(funcName)s: %(message)s',
@@ -38,9 +41,36 @@ class CozeBotException(Exception):
         """
         return self.message
 
+class CozeRetry(Retry):
+    """
+    Retries that never send a chat twice: 429/502/503/504 responses are retried for GET
+    (the status and message list polls) only. A POST may have started a chat already, it
+    is retried only when it was refused with a Retry-After (429 or 503), or on connect errors.
+    """
+    POST_RETRY_STATUSES = (429, 503)
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if method.upper() == 'POST':
+            return bool(self.total and has_retry_after and status_code in self.POST_RETRY_STATUSES)
+        return super().is_retry(method, status_code, has_retry_after)
+
 class CozeBotWrapper:
     """
     A wrapper class for interacting with the Coze Bot API.
+
+    All requests go through one `requests.Session`, so the TCP + TLS connection is kept
+    alive between calls (a polled chat makes up to 22 requests per turn).
+
+    Args:
+        api_key (str): The Coze API key.
+        bot_id (str): The bot to chat with.
+        user_id (str): Identifies the user to the bot.
+        base_url (str): The API base URL (default: "https://api.coze.com/v3").
+        timeout (tuple): (connect, read) timeout in seconds of every request.
+        stream_timeout (float): Read timeout of streamed chats, i.e. the longest pause between events.
+        max_retries (int): Retries of failed connections and busy/gateway responses, see `CozeRetry`.
+        backoff_factor (float): Retries wait backoff_factor * 2^(retry - 1) seconds.
+        pool_maxsize (int): Connections kept open to the API.
     """
     def __init__(
         self,
@@ -48,12 +78,37 @@ class CozeBotWrapper:
         bot_id: str,
         user_id: str,
         base_url: str = "https://api.coze.com/v3",
+        timeout: Tuple[float, float] = (3.05, 10),
+        stream_timeout: float = 60,
+        max_retries: int = 3,
+        backoff_factor: float = 0.3,
+        pool_maxsize: int = 4,
     ):
         self.api_endpoint = f"{base_url}/chat"
         self.api_key = api_key
         self.bot_id = bot_id
         self.user_id = user_id
         self.conversation_id = None
+        self.chat_id = None
+        self.timeout = timeout
+        self.stream_timeout = stream_timeout
+        self.session = requests.Session()
+        self.session.headers.update({
+            'Authorization': f'Bearer {self.api_key}',
+            'Content-Type': 'application/json'
+        })
+        retry = CozeRetry(
+            total=max_retries,
+            read=0,     # The request may have been processed, don't send it twice.
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 502, 503, 504),
+            allowed_methods=frozenset({'GET'}),
+            raise_on_status=False,
+        )
+        # Only one host: a single pool, big enough for a streamed chat plus a few parallel calls.
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, max_retries=retry)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
 
     def _send_request(self, query = None, data = None, method = 'POST'):
         """
@@ -71,15 +126,11 @@ class CozeBotWrapper:
             CozeBotException: If an error occurs during the request process.
         """
         url = self.api_endpoint + query if query else self.api_endpoint
-        headers = {
-            'Authorization': f'Bearer {self.api_key}',
-            'Content-Type': 'application/json'
-        }
         try:
             if method == 'POST' or data:
-                response = requests.post(url, json=data, headers=headers, timeout=10)
+                response = self.session.post(url, json=data, timeout=self.timeout)
             else:
-                response = requests.get(url, headers=headers)
+                response = self.session.get(url, timeout=self.timeout)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
@@ -148,7 +199,7 @@ class CozeBotWrapper:
     def chat_status(self, conversation_id, chat_id) -> bool:
         """
         Example (https://www.coze.com/open):
-        curl --location --request POST 'https://api.coze.com/v3/chat/retrieve?chat_id=<CHAT_ID>&conversation_id=<CONVERSATION_ID>'  
+        curl --location --request GET 'https://api.coze.com/v3/chat/retrieve?chat_id=<CHAT_ID>&conversation_id=<CONVERSATION_ID>'  
              --header 'Authorization: Bearer <API KEY>' 
              --header 'Content-Type: application/json'
         """
@@ -156,7 +207,7 @@ class CozeBotWrapper:
             'chat_id': chat_id,
             'conversation_id': conversation_id
         })
-        resp = self._send_request(query = f"/retrieve?{query}")
+        resp = self._send_request(query = f"/retrieve?{query}", method='GET')
         if not 'data' in resp:
             logging.error(f"No data in response:\n{resp}")
             return False
@@ -171,7 +222,7 @@ class CozeBotWrapper:
     def get_messages(self, conversation_id, chat_id) -> List[Dict]:
         """
         Example (https://www.coze.com/open):
-        curl --location --request POST 'https://api.coze.com/v3/chat/message/list?chat_id=<CHAT_ID>&conversation_id=<CONVERSATION_ID>' 
+        curl --location --request GET 'https://api.coze.com/v3/chat/message/list?chat_id=<CHAT_ID>&conversation_id=<CONVERSATION_ID>' 
             --header 'Authorization: Bearer <API KEY>' \
             --header 'Content-Type: application/json' \
         Returns a list of message objects like this:
@@ -213,7 +264,7 @@ class CozeBotWrapper:
             'chat_id': chat_id,
             'conversation_id': conversation_id
         })
-        resp = self._send_request(query = f"/message/list?{query}")
+        resp = self._send_request(query = f"/message/list?{query}", method='GET')
         if 'data' in resp:
             return resp['data']
         else:
@@ -262,6 +313,76 @@ class CozeBotWrapper:
         
         return None
 
+    def _stream_events(self, data: dict, query: str = None) -> Iterator[Tuple[str, dict]]:
+        """
+        Sends a streaming request and parses the server-sent events.
+
+        Yields:
+            (event, data): The event name and its parsed JSON data.
+
+        Raises:
+            CozeBotException: If an error occurs during the request process, or an event can't be parsed.
+        """
+        url = self.api_endpoint + query if query else self.api_endpoint
+        try:
+            with self.session.post(url, json=data, stream=True,
+                                   timeout=(self.timeout[0], self.stream_timeout)) as response:
+                response.raise_for_status()
+                event, lines = None, []
+                for line in response.iter_lines(decode_unicode=True):
+                    if line:
+                        if line.startswith('event:'):
+                            event = line[len('event:'):].strip()
+                        elif line.startswith('data:'):
+                            lines.append(line[len('data:'):])
+                        continue
+                    # A blank line ends the event.
+                    if event and lines:
+                        try:
+                            payload = json.loads('\n'.join(lines))
+                        except ValueError as e:
+                            raise CozeBotException(f"Malformed '{event}' event: {e}") from e
+                        yield event, payload
+                    event, lines = None, []
+        except requests.exceptions.RequestException as e:
+            raise CozeBotException(f"An error occurred: {e}") from e
+
+    def chat_stream(self, message: str) -> Iterator[str]:
+        """
+        Start or continue a chat with the bot, streaming the answer (`"stream": true`).
+
+        Args:
+            message (str): The message to send to the chat.
+
+        Yields:
+            str: The answer text as it is generated.
+
+        Raises:
+            CozeBotException: If the request or the chat fails.
+        """
+        data = {
+            "bot_id": self.bot_id,
+            "user_id":  self.user_id,
+            'stream': True,
+            "auto_save_history": True,
+            'additional_messages': [{"role": "user", "content": message, "content_type": "text"}],
+        }
+        query = urllib.parse.urlencode({'conversation_id': self.conversation_id}) if self.conversation_id else None
+        for event, payload in self._stream_events(data, query=f"?{query}" if query else None):
+            if event == 'conversation.chat.created':
+                self.conversation_id, self.chat_id = payload['conversation_id'], payload['id']
+            elif event == 'conversation.message.delta':
+                if payload.get('type') == 'answer':
+                    yield payload['content']
+            elif event in ('conversation.chat.failed', 'error'):
+                raise CozeBotException(f"Chat failed: {payload}")
+            elif event == 'done':
+                break
+
+    def close(self):
+        """Close the pooled connections."""
+        self.session.close()
+
     def check_connection(self):
         """
         Check the connection to the Coze Bot API.
@@ -269,12 +390,8 @@ class CozeBotWrapper:
         Raises:
             CozeBotException: If the connection check fails.
         """
-        headers = {
-            'Authorization': f'Bearer {self.api_key}',
-            'Content-Type': 'application/json'
-        }
         try:
-            response = requests.get(self.api_endpoint, headers=headers, timeout=10)
+            response = self.session.get(self.api_endpoint, timeout=self.timeout)
             response.raise_for_status()
             return True
         except requests.exceptions.RequestException as e:
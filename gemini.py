@@ -2,10 +2,8 @@ import logging
 from pprint import pprint
 import random
 import time
-from typing import Dict, List, Tuple
+from typing import Dict, Iterator, List, Tuple
 import urllib.parse
-import requests
-import google.generativeai as genai
 
 logging.basicConfig(
     format='%(asctime)s [%(levelname)s] %(filename)s:%(funcName)s: %(message)s',
@@ -16,9 +14,19 @@ logging.basicConfig(
 )
 
 class GeminiWrapper:
+    """
+    Chat with a Gemini model through `google.generativeai`.
+
+    `client` is the `google.generativeai` module by default; anything with the same
+    `configure` and `GenerativeModel` can stand in for it (e.g. a fake for benchmarks).
+    """
     def __init__(self,
                  api_key: str,
-                 model_name: str = "gemini-1.5-flash"):
+                 model_name: str = "gemini-1.5-flash",
+                 client=None):
+        if client is None:
+            import google.generativeai as client
+        self.genai = client
         self.api_key = api_key
         self.system_inst = None
         self.model_name = model_name
@@ -30,7 +38,7 @@ class GeminiWrapper:
     def new_chat_session(self, system_inst: str):
         self.system_inst = system_inst
 
-        genai.configure(api_key=self.api_key)
+        self.genai.configure(api_key=self.api_key)
         # Create the model
         self.generation_config = {
             "temperature": 1,
@@ -39,7 +47,7 @@ class GeminiWrapper:
             "max_output_tokens": 8192,
             "response_mime_type": "text/plain",
         }
-        self.model = genai.GenerativeModel(
+        self.model = self.genai.GenerativeModel(
             model_name=self.model_name,
             generation_config=self.generation_config,
             system_instruction=self.system_inst,
@@ -49,3 +57,16 @@ class GeminiWrapper:
     def chat(self, message: str) -> str:
         response = self.chat_session.send_message(message)
         return response.text
+
+    def chat_stream(self, message: str) -> Iterator[str]:
+        """Like `chat`, but yields the reply text chunk by chunk as it is generated."""
+        response = self.chat_session.send_message(message, stream=True)
+        # The chat history is only updated once the whole response has been iterated.
+        for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                # No text in this chunk, e.g. only the finish reason or safety ratings.
+                continue
+            if text:
+                yield text
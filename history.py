@@ -0,0 +1,114 @@
+import collections
+import logging
+import re
+import textwrap
+
+logging.basicConfig(
+    format='%(asctime)s [%(levelname)s] %(filename)s:%(funcName)s: %(message)s',
+    level=logging.DEBUG,
+    handlers=[
+        logging.StreamHandler()  # Output logs to stdout
+    ]
+)
+
+def estimate_tokens(text: str) -> int:
+    """Token count without a tokenizer: about 4 characters per token, 1 per CJK character."""
+    wide = sum(1 for c in text if ord(c) > 0x2E7F)
+    return (len(text) - wide + 3) // 4 + wide
+
+class ChatHistory:
+    """
+    The conversation sent along with every request, kept within a token budget.
+
+    Turns (request and reply) are kept whole, oldest first, in a deque. When they don't fit
+    in the budget given to `fit`, the oldest turns are folded into a rolling summary, one
+    short line per turn, sent as a system message right after the system prompt (so the
+    cached system prompt prefix doesn't change). The summary forgets its oldest lines
+    beyond `summary_tokens`.
+
+    `count_tokens(text)` should count with the model's tokenizer, see `LLMBackend.count_tokens`.
+    """
+    # Chat template tokens around every message (role header, end of turn).
+    MESSAGE_OVERHEAD = 5
+    SUMMARY_HEADER = "Summary of the earlier conversation:"
+    # Characters kept of the request and of the reply in a summary line.
+    SUMMARY_WIDTH = 100
+
+    def __init__(self, count_tokens=estimate_tokens, summary_tokens: int = 200, assistant: str = "Assistant"):
+        self.count_tokens = count_tokens
+        self.summary_tokens = summary_tokens
+        self.assistant = assistant
+        # ([user message, assistant message], tokens)
+        self.turns = collections.deque()
+        self.turn_tokens = 0
+        # (line, tokens)
+        self.summary = collections.deque()
+        self.summary_line_tokens = 0
+
+    def message_tokens(self, message: dict) -> int:
+        return self.count_tokens(message["content"]) + self.MESSAGE_OVERHEAD
+
+    def add(self, request: str, reply: str):
+        messages = [{"role": "user", "content": request}, {"role": "assistant", "content": reply}]
+        tokens = sum(self.message_tokens(m) for m in messages)
+        self.turns.append((messages, tokens))
+        self.turn_tokens += tokens
+
+    def summary_size(self) -> int:
+        if not self.summary:
+            return 0
+        return self.summary_line_tokens + estimate_tokens(self.SUMMARY_HEADER) + self.MESSAGE_OVERHEAD
+
+    def size(self) -> int:
+        """Tokens of the messages returned by `messages`."""
+        return self.turn_tokens + self.summary_size()
+
+    def fit(self, budget: int):
+        """Fold the oldest turns into the summary until the history fits in `budget` tokens."""
+        while self.turns and self.size() > budget:
+            messages, tokens = self.turns.popleft()
+            self.turn_tokens -= tokens
+            self.fold(messages[0]["content"], messages[1]["content"])
+        while self.summary and self.size() > budget:
+            self.forget()
+        if self.size() > budget:
+            logging.warning(f"History doesn't fit in {budget} tokens")
+
+    def summarize(self, request: str, reply: str) -> str:
+        """One line for a turn leaving the history: the request and the gist of the reply."""
+        reply = re.sub(r'\$\w+', '', reply).strip()
+        # The first sentence is usually the answer, the rest is chit-chat.
+        reply = re.split(r'(?<=[.!?。！？])\s*', reply, maxsplit=1)[0]
+        request = textwrap.shorten(request, self.SUMMARY_WIDTH, placeholder="...")
+        reply = textwrap.shorten(reply, self.SUMMARY_WIDTH, placeholder="...")
+        return f"- User: {request} {self.assistant}: {reply}"
+
+    def fold(self, request: str, reply: str):
+        line = self.summarize(request, reply)
+        tokens = self.count_tokens(line) + 1
+        self.summary.append((line, tokens))
+        self.summary_line_tokens += tokens
+        while self.summary_line_tokens > self.summary_tokens:
+            self.forget()
+
+    def forget(self):
+        _, tokens = self.summary.popleft()
+        self.summary_line_tokens -= tokens
+
+    def messages(self) -> list:
+        messages = []
+        if self.summary:
+            lines = "\n".join(line for line, _ in self.summary)
+            messages.append({"role": "system", "content": f"{self.SUMMARY_HEADER}\n{lines}"})
+        for turn, _ in self.turns:
+            messages.extend(turn)
+        return messages
+
+    def clear(self):
+        self.turns.clear()
+        self.turn_tokens = 0
+        self.summary.clear()
+        self.summary_line_tokens = 0
+
+    def __len__(self):
+        return len(self.turns)
@@ -0,0 +1,163 @@
+import logging
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+logging.basicConfig(
+    format='%(asctime)s [%(levelname)s] %(filename)s:%(funcName)s: %(message)s',
+    level=logging.DEBUG,
+    handlers=[
+        logging.StreamHandler()  # Output logs to stdout
+    ]
+)
+
+def is_port_in_use(port):
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        return s.connect_ex(('localhost', port)) == 0
+
+class LlamaServer:
+    """
+    Runs `llama_cpp.server` in the background and keeps it alive.
+
+    `start` returns immediately. A watchdog thread launches the server, polls
+    `/v1/models` until it answers (or `ready_timeout` expires), and restarts the
+    server with exponential backoff if it exits. If something is already listening
+    on the port, we only wait for it to become ready and don't manage it.
+
+    `on_state` is called with the new state on every change:
+    'starting', 'ready', 'failed' or 'stopped'.
+    """
+    STARTING = 'starting'
+    READY = 'ready'
+    FAILED = 'failed'
+    STOPPED = 'stopped'
+
+    def __init__(self, config_file: str = 'server_config.json', host: str = '127.0.0.1', port: int = 8000,
+                 command=None, ready_timeout: float = 600.0, probe_interval: float = 0.5,
+                 max_restarts: int = 3, on_state=None):
+        self.command = command or [sys.executable, '-m', 'llama_cpp.server', '--config_file', config_file]
+        self.port = port
+        self.base_url = f"http://{host}:{port}"
+        self.ready_timeout = ready_timeout
+        self.probe_interval = probe_interval
+        self.max_restarts = max_restarts
+        self.on_state = on_state
+        self.state = self.STOPPED
+        # Set while the server is not starting: ready, failed (gave up) or stopped.
+        self.settled_event = threading.Event()
+        self.stop_event = threading.Event()
+        self.process = None
+        self.thread = None
+        self.restarts = 0
+        self.launch_time = None
+        # Seconds from launch until the server answered the health probe.
+        self.startup_time = None
+
+    def probe(self, timeout: float = 1.0) -> bool:
+        try:
+            with urllib.request.urlopen(self.base_url + '/v1/models', timeout=timeout) as response:
+                return response.status == 200
+        except (urllib.error.URLError, OSError, ValueError):
+            return False
+
+    def _set_state(self, state):
+        if state == self.state:
+            return
+        self.state = state
+        if state == self.STARTING:
+            self.settled_event.clear()
+        else:
+            self.settled_event.set()
+        logging.info(f"LLM server {state}")
+        if self.on_state:
+            self.on_state(state)
+
+    def start(self):
+        self.stop_event.clear()
+        self.settled_event.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def wait_ready(self, timeout: float = None) -> bool:
+        """Wait until the server is ready (True), or failed or was stopped (False)."""
+        self.settled_event.wait(timeout)
+        return self.state == self.READY
+
+    def _launch(self):
+        logging.info(f"Launching LLM server: {' '.join(self.command)}")
+        self.launch_time = time.time()
+        self.process = subprocess.Popen(self.command, stdin=subprocess.DEVNULL,
+                                        stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        logging.info(f"LLM server process: {self.process.pid}")
+        threading.Thread(target=self._drain, args=(self.process,), daemon=True).start()
+
+    def _drain(self, process):
+        # Keep reading the server output, otherwise the server blocks once the pipe is full.
+        for line in process.stdout:
+            logging.debug(f"llm server: {line.decode(errors='replace').rstrip()}")
+
+    def _wait_ready(self) -> bool:
+        deadline = time.time() + self.ready_timeout
+        while not self.stop_event.is_set() and time.time() < deadline:
+            if self.process and self.process.poll() is not None:
+                logging.error(f"LLM server exited with code {self.process.returncode} while starting")
+                return False
+            if self.probe():
+                return True
+            self.stop_event.wait(self.probe_interval)
+        if not self.stop_event.is_set():
+            logging.error(f"LLM server not ready after {self.ready_timeout}s")
+        return False
+
+    def _kill(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+
+    def _run(self):
+        if is_port_in_use(self.port):
+            logging.info(f"LLM server already launched on port {self.port}")
+            self._set_state(self.STARTING)
+            self._set_state(self.READY if self._wait_ready() else self.FAILED)
+            return
+
+        while not self.stop_event.is_set():
+            self._set_state(self.STARTING)
+            self._launch()
+            if self._wait_ready():
+                self.startup_time = time.time() - self.launch_time
+                logging.info(f"LLM server ready in {self.startup_time:.2f}s")
+                self.restarts = 0
+                self._set_state(self.READY)
+                # Watch the process, restart it if it crashes.
+                while not self.stop_event.wait(1.0):
+                    if self.process.poll() is not None:
+                        logging.error(f"LLM server exited with code {self.process.returncode}")
+                        break
+            self._kill()
+            if self.stop_event.is_set():
+                break
+            self.restarts += 1
+            if self.restarts > self.max_restarts:
+                logging.error(f"LLM server failed {self.restarts} times, giving up")
+                self._set_state(self.FAILED)
+                return
+            self._set_state(self.STARTING)
+            self.stop_event.wait(min(2 ** self.restarts, 30))
+
+    def stop(self):
+        self.stop_event.set()
+        self._kill()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        self._set_state(self.STOPPED)
+        self.settled_event.set()
@@ -0,0 +1,103 @@
+import json
+import logging
+import time
+
+logging.basicConfig(
+    format='%(asctime)s [%(levelname)s] %(filename)s:%(funcName)s: %(message)s',
+    level=logging.DEBUG,
+    handlers=[
+        logging.StreamHandler()  # Output logs to stdout
+    ]
+)
+
+class LocalLlama:
+    """
+    Runs the model with llama-cpp-python in this process instead of behind `llama_cpp.server`,
+    with explicit prompt-prefix caching.
+
+    `prime` evaluates the system prompt once and stores its KV state in a RAM cache keyed by
+    its tokens. llama-cpp-python reuses the longest common prefix with whatever was evaluated
+    last, and after every turn the state of prompt + reply is cached too, so a turn only has
+    to prefill the new user message (plus whatever part of the history changed). If the
+    history is trimmed, the cached system prompt state is restored instead of prefilling it again.
+
+    Model settings are read from the first model in `server_config.json`, so both modes
+    run the same model the same way.
+    """
+    MARK = "\x00LLAMAPI_MARK\x00"
+
+    def __init__(self, config_file: str = 'server_config.json', use_cache: bool = True):
+        with open(config_file) as f:
+            self.settings = json.load(f)['models'][0]
+        self.use_cache = use_cache
+        self.llama = None
+        self.formatter = None
+        self.prefix_tokens = None
+        self.last_prompt_tokens = 0
+        self.last_reused_tokens = 0
+        self.last_prefill_time = None
+
+    def load(self):
+        from llama_cpp import Llama, LlamaRAMCache
+        from llama_cpp.llama_chat_format import Jinja2ChatFormatter
+
+        s = self.settings
+        t0 = time.time()
+        self.llama = Llama(
+            model_path=s['model'],
+            n_gpu_layers=s.get('n_gpu_layers', 0),
+            offload_kqv=s.get('offload_kqv', True),
+            n_threads=s.get('n_threads'),
+            n_batch=s.get('n_batch', 512),
+            n_ctx=s.get('n_ctx', 2048),
+            verbose=False,
+        )
+        if self.use_cache:
+            self.llama.set_cache(LlamaRAMCache(capacity_bytes=s.get('cache_size', 2 << 30)))
+        # Format prompts ourselves, so we know exactly which tokens the system prompt is.
+        eos = self.llama.detokenize([self.llama.token_eos()], special=True).decode()
+        bos = self.llama.detokenize([self.llama.token_bos()], special=True).decode()
+        self.formatter = Jinja2ChatFormatter(
+            template=self.llama.metadata['tokenizer.chat_template'], eos_token=eos, bos_token=bos)
+        logging.info(f"Loaded {s['model']} in {time.time() - t0:.2f}s")
+
+    def tokenize(self, text: str):
+        return self.llama.tokenize(text.encode('utf-8'), add_bos=False, special=True)
+
+    def format(self, messages):
+        return self.formatter(messages=messages)
+
+    def prime(self, system_msg: dict):
+        """Prefill the system prompt and keep its KV state resident."""
+        # Everything before the first user message is shared by every prompt.
+        prompt = self.format([system_msg, {"role": "user", "content": self.MARK}]).prompt
+        self.prefix_tokens = self.tokenize(prompt[:prompt.index(self.MARK)])
+        t0 = time.time()
+        self.llama.reset()
+        self.llama.eval(self.prefix_tokens)
+        if self.use_cache:
+            self.llama.cache[self.prefix_tokens] = self.llama.save_state()
+        logging.info(f"Prefilled {len(self.prefix_tokens)} system prompt tokens in {time.time() - t0:.2f}s")
+
+    def stream(self, messages, max_tokens: int = 512):
+        """Generate a reply, yields the text as it is generated."""
+        from llama_cpp import Llama
+
+        formatted = self.format(messages)
+        tokens = self.tokenize(formatted.prompt)
+        if not self.use_cache:
+            # Baseline for benchmarking: prefill the whole prompt every time.
+            self.llama.reset()
+        self.last_prompt_tokens = len(tokens)
+        self.last_reused_tokens = Llama.longest_token_prefix(
+            self.llama.input_ids[:self.llama.n_tokens].tolist(), tokens)
+
+        t0 = time.time()
+        self.last_prefill_time = None
+        for chunk in self.llama.create_completion(tokens, max_tokens=max_tokens, stream=True,
+                                                  stop=formatted.stop):
+            if self.last_prefill_time is None:
+                self.last_prefill_time = time.time() - t0
+                logging.info(f"Prefill: {self.last_prompt_tokens} prompt tokens "
+                             f"({self.last_reused_tokens} already evaluated) in {self.last_prefill_time:.2f}s")
+            yield chunk['choices'][0]['text']
@@ -0,0 +1,125 @@
+import logging
+import queue
+import threading
+import time
+
+logging.basicConfig(
+    format='%(asctime)s [%(levelname)s] %(filename)s:%(funcName)s: %(message)s',
+    level=logging.DEBUG,
+    handlers=[
+        logging.StreamHandler()  # Output logs to stdout
+    ]
+)
+
+# What to do with a new gesture while the arm is still moving.
+QUEUE = 'queue'     # Run it after the current one.
+CANCEL = 'cancel'   # Cut the current one short (the arm goes home), then run the new one.
+IGNORE = 'ignore'   # Drop it.
+
+class MotionController:
+    """
+    Runs robot arm gestures on a dedicated thread, so a gesture can start while the
+    reply is still being spoken.
+
+    `dispatch` validates the command against the gesture registry of the arm
+    (`robot_arm.GESTURES`, name -> keyframes, None for "stay put") and returns right away,
+    `cancel` stops the running gesture and drops the queued ones. Every gesture gets its own
+    cancel event when it is dispatched, so a cancel is never lost on its way to the arm.
+    Overlapping gestures are handled according to `policy` (QUEUE, CANCEL or IGNORE).
+    `on_done(name, start, end)` is called after every gesture (time.monotonic() timestamps).
+    """
+    def __init__(self, robot_arm, policy: str = QUEUE, on_done=None):
+        if policy not in (QUEUE, CANCEL, IGNORE):
+            raise ValueError(f"Unknown motion policy: {policy}")
+        self.robot_arm = robot_arm
+        self.policy = policy
+        self.on_done = on_done
+        self.queue = queue.Queue()
+        self.current = None
+        # Cancel events of the gestures dispatched and not done yet.
+        self.pending = set()
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def validate(self, command: str):
+        """The gesture name for `command`, or None if the arm doesn't know it."""
+        name = command.strip().lower()
+        return name if name in self.robot_arm.GESTURES else None
+
+    def is_complete(self, word: str) -> bool:
+        """
+        True if `word` already names a gesture and can't grow into another one, so
+        the gesture can start before the stream shows where the word ends.
+        """
+        name = word.lower()
+        return name in self.robot_arm.GESTURES and not any(
+            g != name and g.startswith(name) for g in self.robot_arm.GESTURES)
+
+    def busy(self) -> bool:
+        return self.queue.unfinished_tasks > 0
+
+    def dispatch(self, command: str) -> bool:
+        """Start (or queue) the gesture for `command`. Returns False if it was rejected."""
+        name = self.validate(command)
+        if name is None:
+            logging.info(f"ROBOT: unknown command '{command}', ignored")
+            return False
+        if self.robot_arm.GESTURES[name] is None:
+            logging.info(f"ROBOT: {name}")
+            return True
+        if self.busy():
+            if self.policy == IGNORE:
+                logging.info(f"ROBOT: still doing '{self.current}', '{name}' dropped")
+                return False
+            if self.policy == CANCEL:
+                logging.info(f"ROBOT: cancelling '{self.current}' for '{name}'")
+                self.cancel()
+        cancelled = threading.Event()
+        with self.lock:
+            self.pending.add(cancelled)
+        self.queue.put((name, cancelled))
+        return True
+
+    def cancel(self):
+        with self.lock:
+            for cancelled in self.pending:
+                cancelled.set()
+        self._drop_queued()
+
+    def _drop_queued(self):
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                return
+            self.queue.task_done()
+
+    def _run(self):
+        while True:
+            name, cancelled = self.queue.get()
+            if name is None:
+                self.queue.task_done()
+                return
+            self.current = name
+            logging.info(f"ROBOT: {name}")
+            start = time.monotonic()
+            try:
+                self.robot_arm.perform(name, cancelled)
+            except Exception as e:
+                logging.error(f"ROBOT: '{name}' failed: {e}")
+            with self.lock:
+                self.pending.discard(cancelled)
+            self.current = None
+            if self.on_done:
+                self.on_done(name, start, time.monotonic())
+            self.queue.task_done()
+
+    def wait(self):
+        """Block until all dispatched gestures are done."""
+        self.queue.join()
+
+    def close(self):
+        self.cancel()
+        self.queue.put((None, None))
+        self.thread.join()
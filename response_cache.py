@@ -0,0 +1,125 @@
+import collections
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+import unicodedata
+import zlib
+
+logging.basicConfig(
+    format='%(asctime)s [%(levelname)s] %(filename)s:%(funcName)s: %(message)s',
+    level=logging.DEBUG,
+    handlers=[
+        logging.StreamHandler()  # Output logs to stdout
+    ]
+)
+
+# A cached turn: the reply text, its `$command`, and the spoken sentences as
+# (text, lang, sample_rate, pcm) tuples (sample_rate and pcm None without audio).
+CachedResponse = collections.namedtuple('CachedResponse', ['reply', 'command', 'sentences'])
+
+def normalize_transcript(text: str) -> str:
+    """Lowercase, without punctuation and extra spaces: "Hello!" and "hello." are the same request."""
+    text = unicodedata.normalize('NFKC', text).lower()
+    text = ''.join(' ' if unicodedata.category(c).startswith('P') else c for c in text)
+    return ' '.join(text.split())
+
+class ResponseCache:
+    """
+    Replies to requests heard before, with their synthesized audio, so a repeated request
+    ("hello", "what's your name") is answered without the LLM or piper.
+
+    The key is the normalized transcript plus a fingerprint of everything else in the
+    prompt (system prompt and history) and the reply language. The least recently used
+    entries beyond `max_entries`, and entries older than `ttl` seconds, are dropped.
+    Entries are kept in SQLite (`path`, or in memory), with the audio of all the sentences
+    of a reply zlib-compressed into one blob.
+    """
+    def __init__(self, path: str = None, max_entries: int = 64, ttl: float = 7 * 24 * 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        # Used from the turn threads.
+        self.db = sqlite3.connect(path or ':memory:', check_same_thread=False)
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY, created REAL, used REAL,
+                reply TEXT, command TEXT, sentences TEXT, audio BLOB
+            )""")
+        # key -> created, least recently used first.
+        self.entries = collections.OrderedDict(
+            self.db.execute("SELECT key, created FROM responses ORDER BY used"))
+        self.hits = 0
+        self.misses = 0
+        with self.lock:
+            self._evict()
+
+    @staticmethod
+    def key(request: str, context: list, lang: str = None) -> str:
+        fingerprint = json.dumps([context, lang], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha1(f"{normalize_transcript(request)}\n{fingerprint}".encode()).hexdigest()
+
+    def get(self, key: str):
+        """The `CachedResponse` for `key`, or None."""
+        with self.lock:
+            created = self.entries.get(key)
+            if created is None or time.time() - created > self.ttl:
+                self.misses += 1
+                self._evict()
+                return None
+            self.entries.move_to_end(key)
+            self.db.execute("UPDATE responses SET used = ? WHERE key = ?", (time.time(), key))
+            self.db.commit()
+            reply, command, sentences, audio = self.db.execute(
+                "SELECT reply, command, sentences, audio FROM responses WHERE key = ?", (key,)).fetchone()
+            self.hits += 1
+        audio = zlib.decompress(audio) if audio else b''
+        spoken = []
+        offset = 0
+        for text, lang, rate, size in json.loads(sentences):
+            pcm = None
+            if size is not None:
+                pcm = audio[offset:offset + size]
+                offset += size
+            spoken.append((text, lang, rate, pcm))
+        return CachedResponse(reply, command, spoken)
+
+    def put(self, key: str, response: CachedResponse):
+        sentences = [(text, lang, rate, len(pcm) if pcm is not None else None)
+                     for text, lang, rate, pcm in response.sentences]
+        audio = b''.join(pcm for _, _, _, pcm in response.sentences if pcm is not None)
+        now = time.time()
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)", (
+                key, now, now, response.reply, response.command,
+                json.dumps(sentences, ensure_ascii=False), zlib.compress(audio) if audio else None))
+            self.entries[key] = now
+            self.entries.move_to_end(key)
+            self._evict()
+
+    def _evict(self):
+        now = time.time()
+        expired = [k for k, created in self.entries.items() if now - created > self.ttl]
+        while len(self.entries) - len(expired) > self.max_entries:
+            k = next(k for k in self.entries if k not in expired)
+            expired.append(k)
+        for k in expired:
+            del self.entries[k]
+        if expired:
+            self.db.executemany("DELETE FROM responses WHERE key = ?", [(k,) for k in expired])
+        self.db.commit()
+
+    def clear(self):
+        with self.lock:
+            self.db.execute("DELETE FROM responses")
+            self.db.commit()
+            self.entries.clear()
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    def __len__(self):
+        return len(self.entries)
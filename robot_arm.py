@@ -1,103 +1,162 @@
+import math
+import threading
 import time
 from PCA9685 import PCA9685
 
 class RobotArm:
+    """
+    Gestures are keyframes, played on a fixed control tick: every `TICK` seconds all the
+    channels moving in the current keyframe are stepped at once, on the way from where
+    they are to the keyframe targets.
+
+    `perform` blocks until the gesture is done; run it on its own thread (`MotionController`
+    in motion.py). `cancel` (from any thread) stops the gesture within a tick, and the
+    arm goes back home.
+    """
     CH_CLAW = 0         # 500 (open) - 1500 (close)
     CH_WRIST = 1        # 500 (horizontal) - 1500 (vertical) - 2000 - 2500 (~horizontal)
     CH_JOINT1 = 2       # 280 (lowest) - 1400 (parallel with J2, highest) - 2400
     CH_JOINT2 = 3       # 280 (lowest) - 1800 (parallel with J3, highest) - 2000
     CH_JOINT3 = 4       # 280 - 400 (higest, vertical) - 1400 (horizontal)
     CH_BASE = 5         # 280 -> counterclockwise -> 2400
-    def __init__(self, debug=False):
-        self.pwm = PCA9685(0x40, debug=debug)
+
+    # Servo pulse (us) per channel at rest, in the order `reset` moves them.
+    HOME = {
+        CH_BASE: 280,
+        CH_JOINT3: 1000,
+        CH_JOINT2: 1200,
+        CH_JOINT1: 700,
+        CH_WRIST: 500,
+        CH_CLAW: 500,
+    }
+    # Seconds between servo updates (one 50 Hz PWM period).
+    TICK = 0.02
+    # Seconds to go back home after a gesture that was cancelled.
+    HOME_TIME = 0.5
+
+    # Commands the LLM may give, and the gesture for each (None: stay put).
+    # A gesture is a list of keyframes: (seconds, {channel: pulse}), the listed channels
+    # move together to their pulse in that time. No channels means hold still.
+    # Gestures start and end at HOME.
+    GESTURES = {
+        "greet": [
+            (0.5, {CH_CLAW: 1500}),
+            (0.5, {CH_CLAW: 500}),
+            (0.5, {CH_CLAW: 1500}),
+            (0.5, {CH_CLAW: 500}),
+        ],
+        "smile": [
+            (0.75, {CH_WRIST: 2000}),
+            (0.75, {CH_WRIST: 500}),
+        ],
+        "pat": [
+            (0.6, {CH_JOINT1: 1000}),
+            (0.6, {CH_JOINT1: 700}),
+            (0.6, {CH_JOINT1: 1000}),
+            (0.6, {CH_JOINT1: 700}),
+        ],
+        "retrieve": [
+            (1.8, {CH_JOINT2: 300}),
+            # JOINT1 is already in place at home
+            (1.8, {CH_CLAW: 1400}),
+            # Lift and turn at the same time
+            (1.8, {CH_JOINT2: 1200, CH_BASE: 1000}),
+            (0.5, {}),
+            (1.8, {CH_CLAW: 500}),
+            (0.5, {}),
+            (1.44, {CH_BASE: 280}),
+        ],
+        "idle": None,
+    }
+
+    def __init__(self, debug=False, pwm=None):
+        # Of the running gesture, set by `cancel`: the gesture stops and the arm goes home.
+        self.cancelled = threading.Event()
+        # Last pulse sent to each channel.
+        self.pose = {}
+        self.pwm = pwm or PCA9685(0x40, debug=debug)
         self.pwm.setPWMFreq(50)
         self.reset()
 
+    def set_pulse(self, ch, pulse):
+        self.pwm.setServoPulse(ch, pulse)
+        self.pose[ch] = pulse
+
+    def set_pulses(self, pulses):
+        # One bus transfer for neighbouring channels.
+        self.pwm.setServoPulses(pulses)
+        self.pose.update(pulses)
+
     def reset(self):
-        self.pwm.setServoPulse(self.CH_BASE, 280)
-        time.sleep(0.1)
+        """
+        Move to HOME one servo at a time (the arm may be anywhere, e.g. at power up).
+        Servos the driver knows are already home are skipped, with their pause.
+        """
+        for ch, pulse in self.HOME.items():
+            if self.pwm.isServoPulse(ch, pulse):
+                self.pose[ch] = pulse
+                continue
+            self.set_pulse(ch, pulse)
+            time.sleep(0.1)
 
-        self.pwm.setServoPulse(self.CH_JOINT3, 1000)
-        time.sleep(0.1)
+    def move(self, targets, duration, cancellable=True):
+        """
+        Move the channels in `targets` ({channel: pulse}) together, in a straight line from
+        where they are, over `duration` seconds. Returns False if cancelled on the way.
+        """
+        start = {ch: self.pose.get(ch, pulse) for ch, pulse in targets.items()}
+        ticks = max(1, math.ceil(duration / self.TICK))
+        deadline = time.monotonic()
+        for i in range(1, ticks + 1):
+            step = {}
+            for ch, pulse in targets.items():
+                p = round(start[ch] + (pulse - start[ch]) * i / ticks)
+                if p != self.pose.get(ch):
+                    step[ch] = p
+            if step:
+                self.set_pulses(step)
+            # Sleep until the next tick (not for a tick), so the writes don't add up to drift.
+            deadline += self.TICK
+            delay = deadline - time.monotonic()
+            if cancellable:
+                if self.cancelled.wait(max(delay, 0)):
+                    return False
+            elif delay > 0:
+                time.sleep(delay)
+        return True
 
-        self.pwm.setServoPulse(self.CH_JOINT2, 1200)
-        time.sleep(0.1)
+    def play(self, keyframes):
+        """Play keyframes (see GESTURES). Returns False if cancelled."""
+        for duration, targets in keyframes:
+            if not self.move(targets, duration):
+                return False
+        return True
 
-        self.pwm.setServoPulse(self.CH_JOINT1, 700)
-        time.sleep(0.1)
+    def go_home(self, duration=None):
+        away = {ch: pulse for ch, pulse in self.HOME.items() if self.pose.get(ch) != pulse}
+        if away:
+            self.move(away, self.HOME_TIME if duration is None else duration, cancellable=False)
 
-        self.pwm.setServoPulse(self.CH_WRIST, 500)
-        time.sleep(0.1)
+    def perform(self, name, cancelled=None):
+        """
+        Run the gesture registered as `name` in `GESTURES` (blocks until done).
+        `cancelled` is the event that stops it (a new one by default). It may be set
+        before the gesture starts, e.g. by the `MotionController` it was queued in.
+        """
+        keyframes = self.GESTURES[name]
+        self.cancelled = cancelled or threading.Event()
+        if keyframes and not self.cancelled.is_set():
+            self.reset()
+            self.play(keyframes)
+            self.go_home()
+
+    def cancel(self):
+        self.cancelled.set()
 
-        self.pwm.setServoPulse(self.CH_CLAW, 500)
-        time.sleep(0.1)
-    
-    def turn(self, ch, start=500, end=2500, speed=1):
-        step = 10 if start < end else -10
-        step = step * speed
-        for i in range(start, end, step):
-            self.pwm.setServoPulse(ch, i)
-            time.sleep(0.02)
-    
     def test(self):
-        self.greet()
-        time.sleep(1)
-        self.smile()
-        time.sleep(1)
-        self.pat()
-        time.sleep(1)
-        self.retrieve()
-    
-    def greet(self):
-        self.reset()
-        time.sleep(0.02)
-        self.turn(self.CH_CLAW, 500, 1500, 4)
-        time.sleep(0.02)
-        self.turn(self.CH_CLAW, 1500, 500, 4)
-        time.sleep(0.02) 
-        self.turn(self.CH_CLAW, 500, 1500, 4)
-        time.sleep(0.02)
-        self.turn(self.CH_CLAW, 1500, 500, 4)
-        time.sleep(0.02)
-        self.reset()
-    
-    def smile(self):
-        self.reset()
-        # self.turn(self.CH_WRIST, 500, 2500, 5)
-        self.turn(self.CH_WRIST, 500, 2000, 4)
-        time.sleep(0.02)
-        self.turn(self.CH_WRIST, 2000, 500, 4)
-        time.sleep(0.02)
-        self.reset()
-    
-    def pat(self):
-        self.reset()
-        self.turn(self.CH_JOINT1, 700, 1000)
-        time.sleep(0.02)
-        self.turn(self.CH_JOINT1, 1000, 700)
-        time.sleep(0.02)
-        self.turn(self.CH_JOINT1, 700, 1000)
-        time.sleep(0.02)
-        self.turn(self.CH_JOINT1, 1000, 700)
-        time.sleep(0.02)
-        self.reset()
-    
-    def retrieve(self):
-        self.reset()
-        self.turn(self.CH_JOINT2, 1200, 300)
-        time.sleep(0.02)
-        # JOINT1 is already in place after reset
-        self.turn(self.CH_CLAW, 500, 1400)
-        time.sleep(0.02)
-        self.turn(self.CH_JOINT2, 300, 1200)
-        time.sleep(0.02)
-        self.turn(self.CH_BASE, 280, 1000)
-        time.sleep(0.5)
-        self.turn(self.CH_CLAW, 1400, 500)
-        time.sleep(0.5)
-        self.turn(self.CH_BASE, 1000, 280)
-        time.sleep(0.02)
-        self.reset()
+        for name in ("greet", "smile", "pat", "retrieve"):
+            self.perform(name)
+            time.sleep(1)
 
 if __name__ == "__main__":
     robot_arm = RobotArm()
@@ -0,0 +1,129 @@
+import logging
+import re
+
+logging.basicConfig(
+    format='%(asctime)s [%(levelname)s] %(filename)s:%(funcName)s: %(message)s',
+    level=logging.DEBUG,
+    handlers=[
+        logging.StreamHandler()  # Output logs to stdout
+    ]
+)
+
+def split_into_sentences(resp):
+    """
+    Split a whole response into sentences.
+
+    This is what `LlamaPi.llm` used to run on the accumulated response for every
+    streamed token; it is kept as the reference for `benchmark.py segmenter`.
+    """
+    # Split the response into sentences.
+    parts = re.split(r'([.;:!?])\s*', resp)
+
+    # Separators will be in the list at odd indices, sentences at even indices
+    separators = [parts[i] for i in range(1, len(parts), 2)]
+    logging.debug(f"separators: {separators}")
+
+    # Remove empty strings from the list
+    # sentences = [s for s in sentences if s]
+    sentences = [parts[i] for i in range(0, len(parts), 2) if parts[i]]
+    logging.debug(f"sentences: {sentences}")
+
+    # Append the separators to the back of each sentence, might be better for TTS.
+    for i in range(len(sentences)):
+        # Just to be safe... there should be same # of seperators and sentences.
+        if i < len(separators):
+            sentences[i] += separators[i]
+
+    return sentences
+
+class SentenceSegmenter:
+    """
+    Incremental sentence splitter for a streamed LLM reply.
+
+    `feed` only looks at the newly arrived text and returns the sentences it
+    completed. ASCII stops (`.;:!?`) end a sentence once they are followed by
+    whitespace, so "3.5" or "e.g." in the middle of a word don't split. CJK
+    full-width stops end a sentence right away, since CJK text has no spaces.
+
+    The command marker followed by a letter (`$greet`) closes the current sentence,
+    and the word is not spoken but becomes `command`; `command_done` is set once the
+    word is complete (or the stream ended). A later command replaces it, and text after
+    the word is spoken again. The marker followed by anything else (`$5`) is just text.
+    """
+    ASCII_STOPS = '.;:!?'
+    CJK_STOPS = '。！？；：…．'
+    # May directly follow a stop and still belong to the sentence, e.g. `"Hi!"` or `(sure.)`.
+    CLOSERS = '"\')]”’」』）'
+
+    def __init__(self, command_marker: str = '$'):
+        self.command_marker = command_marker
+        self.reset()
+
+    def reset(self):
+        self.pending = []
+        self.holding = False    # Last char was an ASCII stop, waiting to see what follows.
+        self.marker = False     # Last char was the command marker, waiting to see what follows.
+        self.in_command = False
+        self.command = None
+        self.command_done = False
+
+    def _emit(self, sentences):
+        s = ''.join(self.pending).strip()
+        self.pending = []
+        self.holding = False
+        # Skip fragments that are only punctuation, nothing to say there.
+        if any(c.isalnum() for c in s):
+            sentences.append(s)
+
+    def _text(self, ch, sentences):
+        if self.holding:
+            if ch in self.ASCII_STOPS or ch in self.CLOSERS:
+                self.pending.append(ch)
+                return
+            if ch.isspace():
+                self._emit(sentences)
+                return
+            self.holding = False
+        self.pending.append(ch)
+        if ch in self.CJK_STOPS:
+            self._emit(sentences)
+        elif ch in self.ASCII_STOPS:
+            self.holding = True
+
+    def feed(self, text: str):
+        """Add streamed text, returns the list of sentences completed by it."""
+        sentences = []
+        for ch in text:
+            if self.marker:
+                self.marker = False
+                if ch.isalpha():
+                    self._emit(sentences)
+                    self.command = ch
+                    self.command_done = False
+                    self.in_command = True
+                    continue
+                # Not a command, e.g. "$5".
+                self._text(self.command_marker, sentences)
+            if self.in_command:
+                if ch.isalnum() or ch == '_':
+                    self.command += ch
+                    continue
+                self.in_command = False
+                self.command_done = True
+            if ch == self.command_marker:
+                self.marker = True
+                continue
+            self._text(ch, sentences)
+        return sentences
+
+    def flush(self):
+        """End of the stream: returns whatever is left as the last sentence."""
+        sentences = []
+        if self.marker:
+            self.marker = False
+            self._text(self.command_marker, sentences)
+        if self.in_command:
+            self.in_command = False
+            self.command_done = True
+        self._emit(sentences)
+        return sentences
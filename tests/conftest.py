@@ -0,0 +1,28 @@
+import os
+import socket
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'tools'))
+
+@pytest.fixture(scope='session')
+def root():
+    """The repository root."""
+    return ROOT
+
+@pytest.fixture(scope='session')
+def tool_command(root):
+    """The command line that runs a script of tools/, e.g. `tool_command('llm_stub.py')`."""
+    def command(name):
+        return [sys.executable, os.path.join(root, 'tools', name)]
+    return command
+
+@pytest.fixture
+def free_port():
+    """A local TCP port nobody listens on."""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
@@ -0,0 +1,134 @@
+import json
+import subprocess
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from backends import CozeBackend, LLMBackendError
+from cozewrapper import CozeBotWrapper, CozeBotException
+from llm_stub import make_reply, tokenize
+
+@pytest.fixture
+def coze_stub(request, free_port, tool_command):
+    """Starts tools/coze_stub.py with the arguments of `@pytest.mark.parametrize('coze_stub', ...)`."""
+    command = tool_command('coze_stub.py') + ['--port', str(free_port), '--first-token-time', '0', '--token-time', '0']
+    stub = subprocess.Popen(command + getattr(request, 'param', []), stderr=subprocess.PIPE, text=True)
+    # The stub says so once it is listening.
+    assert "listening" in stub.stderr.readline()
+    bot = CozeBotWrapper("key", "bot", "user", base_url=f"http://127.0.0.1:{free_port}/v3")
+    yield bot
+    bot.close()
+    stub.kill()
+    stub.wait()
+
+def user(text):
+    return [{"role": "user", "content": text, "content_type": "text"}]
+
+@pytest.mark.parametrize('coze_stub', [[], ['--multiline-data']], indirect=True, ids=['data', 'multiline-data'])
+def test_answer_streamed_in_order(coze_stub):
+    reply = make_reply(user("hello"))
+    assert list(coze_stub.chat_stream("hello")) == tokenize(reply)
+
+def test_conversation_continued(coze_stub):
+    list(coze_stub.chat_stream("hello"))
+    conversation_id, chat_id = coze_stub.conversation_id, coze_stub.chat_id
+    assert conversation_id and chat_id
+    list(coze_stub.chat_stream("what is your name?"))
+    # The stub starts a new conversation unless the request names one.
+    assert coze_stub.conversation_id == conversation_id
+    assert coze_stub.chat_id != chat_id
+
+@pytest.mark.parametrize('coze_stub', [['--fail', 'chat'], ['--fail', 'error']], indirect=True, ids=['failed', 'error'])
+def test_failed_chat_raises(coze_stub):
+    deltas = []
+    with pytest.raises(CozeBotException):
+        for delta in coze_stub.chat_stream("hello"):
+            deltas.append(delta)
+    assert deltas == tokenize(make_reply(user("hello")))[:1]
+
+class ScriptedHandler(BaseHTTPRequestHandler):
+    """
+    Answers every request with the next (status, headers) or (status, headers, body) of
+    `server.script`, then 200. The body is a completed chat by default.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _respond(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with self.server.lock:
+            self.server.requests.append((self.command, self.path.split('?')[0]))
+            status, headers, *body = self.server.script.pop(0) if self.server.script else (200, {})
+        body = body[0] if body else json.dumps({"code": 0, "msg": "", "data": {"status": "completed"}}).encode()
+        headers = {"Content-Type": "application/json", **headers}
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = _respond
+    do_POST = _respond
+
+@pytest.fixture
+def scripted():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ScriptedHandler)
+    server.requests, server.script, server.lock = [], [], threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def wrapper(server):
+    return CozeBotWrapper("key", "bot", "user", base_url=f"http://127.0.0.1:{server.server_port}/v3",
+                          backoff_factor=0)
+
+def test_chat_not_resent_on_gateway_errors(scripted):
+    scripted.script = [(504, {})] * 3
+    bot = wrapper(scripted)
+    with pytest.raises(CozeBotException):
+        bot.start_chat([{"role": "user", "content": "hi", "content_type": "text"}])
+    with pytest.raises(CozeBotException):
+        list(bot.chat_stream("hi"))
+    assert scripted.requests == [("POST", "/v3/chat")] * 2
+    bot.close()
+
+def test_chat_resent_after_retry_after(scripted):
+    scripted.script = [(429, {"Retry-After": "0"}), (503, {"Retry-After": "0"}), (503, {})]
+    bot = wrapper(scripted)
+    with pytest.raises(CozeBotException):
+        bot.start_chat([{"role": "user", "content": "hi", "content_type": "text"}])
+    assert scripted.requests == [("POST", "/v3/chat")] * 3
+    bot.close()
+
+def test_polls_retried(scripted):
+    scripted.script = [(502, {}), (503, {}), (504, {})]
+    bot = wrapper(scripted)
+    assert bot.chat_status("conversation", "chat")
+    assert scripted.requests == [("GET", "/v3/chat/retrieve")] * 4
+    bot.close()
+
+MALFORMED = (b'event:conversation.message.delta\ndata:{"type": "answer", "content": "Hi"}\n\n'
+             b'event:conversation.message.delta\ndata:{"type": "answer", "cont\n\n')
+
+def test_malformed_event_raises(scripted):
+    scripted.script = [(200, {"Content-Type": "text/event-stream"}, MALFORMED)]
+    bot = wrapper(scripted)
+    deltas = []
+    with pytest.raises(CozeBotException):
+        for delta in bot.chat_stream("hi"):
+            deltas.append(delta)
+    assert deltas == ["Hi"]
+    bot.close()
+
+def test_malformed_event_fails_the_turn(scripted):
+    scripted.script = [(200, {"Content-Type": "text/event-stream"}, MALFORMED)]
+    backend = CozeBackend("key", "bot", base_url=f"http://127.0.0.1:{scripted.server_port}/v3")
+    # The turn engine handles LLMBackendError, anything else would kill the turn thread.
+    with pytest.raises(LLMBackendError):
+        list(backend.stream([{"role": "user", "content": "hi"}]))
+    backend.close()
@@ -0,0 +1,41 @@
+from backends import GeminiBackend
+from gemini import GeminiWrapper
+from genai_stub import FakeGenAI
+from LlamaPi_gemini import LlamaPiGemini
+
+SENTENCES = [
+    "Hello there, I'm Assistant.",
+    "It's nice to meet you!",
+    "My robot arm can also hand things over to you.",
+]
+REPLY = " ".join(SENTENCES) + " $greet"
+
+def test_chunks_without_text_skipped():
+    bot = GeminiWrapper("fake", client=FakeGenAI(REPLY, no_text_chunks=True))
+    bot.new_chat_session("You are a robot.")
+    chunks = list(bot.chat_stream("hello"))
+    assert len(chunks) > 1
+    assert "".join(chunks) == REPLY
+
+def gemini_app(client):
+    class App(LlamaPiGemini):
+        def speak_back(self, text, lang=None, block=True):
+            # What was said, and how many chunks of the reply had been streamed by then.
+            self.spoken.append((text, client.streamed))
+
+    app = App()
+    app.spoken = []
+    app.commands = []
+    app.add_listener(lambda kind, data: app.commands.append(data) if kind == 'command' else None)
+    app.backend = GeminiBackend("fake", app.system_msg["content"], client=client)
+    app.backend.start(app.on_backend_state)
+    return app
+
+def test_streamed_reply_spoken_sentence_by_sentence():
+    client = FakeGenAI(REPLY, no_text_chunks=True)
+    app = gemini_app(client)
+    assert app.llm("hello") == "greet"
+    assert [text for text, _ in app.spoken] == SENTENCES
+    # The first sentence was spoken while the rest of the reply was still streaming.
+    assert app.spoken[0][1] < client.streamed
+    assert app.commands == ["greet"]
@@ -0,0 +1,84 @@
+from history import ChatHistory, estimate_tokens
+
+def words(text):
+    return len(text.split())
+
+def history(summary_tokens=200):
+    return ChatHistory(words, summary_tokens, "Skyler")
+
+CHIT_CHAT = "Is there anything else I can help you with today? I'm always happy to chat. "
+
+def turn(i):
+    return f"question number {i}", f"Answer number {i}. {CHIT_CHAT * 2}$greet"
+
+def turn_tokens(i):
+    return sum(words(text) + ChatHistory.MESSAGE_OVERHEAD for text in turn(i))
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcdefgh") == 2
+    assert estimate_tokens("你好") == 2
+
+def test_fits_whole():
+    h = history()
+    for i in range(3):
+        h.add(*turn(i))
+    assert h.size() == 3 * turn_tokens(0)
+    h.fit(h.size())
+    assert len(h) == 3
+    assert [m["role"] for m in h.messages()] == ["user", "assistant"] * 3
+
+def test_oldest_turn_summarized():
+    h = history()
+    for i in range(4):
+        h.add(*turn(i))
+    h.fit(h.size() - 1)
+    # A summary line is much shorter than the turn.
+    assert len(h) == 3
+    assert h.size() < 4 * turn_tokens(0)
+    summary, *turns = h.messages()
+    assert summary["role"] == "system"
+    # The request and the first sentence of the reply, without the command.
+    assert summary["content"] == f"{ChatHistory.SUMMARY_HEADER}\n- User: question number 0 Skyler: Answer number 0."
+    assert turns[0]["content"] == "question number 1"
+
+def test_fit_in_budget():
+    h = history()
+    for i in range(10):
+        h.add(*turn(i))
+    budget = 4 * turn_tokens(0)
+    h.fit(budget)
+    assert h.size() <= budget
+    assert len(h) >= 2
+    # Every turn is either whole or in the summary.
+    lines = h.messages()[0]["content"].split("\n")[1:]
+    assert lines == [h.summarize(*turn(i)) for i in range(10 - len(h))]
+    # The newest turns are kept whole.
+    assert h.messages()[-1]["content"] == turn(9)[1]
+
+def test_summary_forgets_oldest_lines():
+    line_tokens = words(history().summarize(*turn(0))) + 1
+    h = history(summary_tokens=2 * line_tokens)
+    for i in range(5):
+        h.add(*turn(i))
+    h.fit(turn_tokens(0) - 1)
+    assert len(h) == 0
+    lines = h.messages()[0]["content"].split("\n")[1:]
+    assert lines == [h.summarize(*turn(3)), h.summarize(*turn(4))]
+    assert h.summary_line_tokens <= h.summary_tokens
+
+def test_summary_forgotten_to_fit():
+    h = history()
+    for i in range(3):
+        h.add(*turn(i))
+    h.fit(0)
+    assert len(h) == 0
+    assert h.messages() == []
+    assert h.size() == 0
+
+def test_clear():
+    h = history()
+    h.add(*turn(0))
+    h.fold(*turn(1))
+    h.clear()
+    assert h.size() == 0 and h.messages() == []
@@ -0,0 +1,86 @@
+import sys
+import threading
+import time
+
+import pytest
+
+from llm_server import LlamaServer
+
+class States:
+    def __init__(self):
+        self.states = []
+        self.changed = threading.Condition()
+
+    def __call__(self, state):
+        with self.changed:
+            self.states.append(state)
+            self.changed.notify_all()
+
+    def wait_for(self, count, state, timeout=20):
+        with self.changed:
+            assert self.changed.wait_for(lambda: self.states.count(state) >= count, timeout), self.states
+
+@pytest.fixture
+def stub_server(free_port, tool_command):
+    """Makes a LlamaServer running tools/llm_stub.py."""
+    def server(on_state, load_time=0.2, **kwargs):
+        command = tool_command('llm_stub.py') + ['--port', str(free_port), '--load-time', str(load_time)]
+        return LlamaServer(port=free_port, command=command, probe_interval=0.1, on_state=on_state, **kwargs)
+    return server
+
+def test_ready(stub_server):
+    states = States()
+    server = stub_server(states)
+    server.start()
+    try:
+        assert server.wait_ready(20)
+        assert server.state == LlamaServer.READY
+        assert server.probe()
+        assert states.states == [LlamaServer.STARTING, LlamaServer.READY]
+        assert server.startup_time >= 0.2
+    finally:
+        server.stop()
+    assert server.state == LlamaServer.STOPPED
+    assert not server.wait_ready(0)
+
+def test_restarted_after_a_crash(stub_server):
+    states = States()
+    server = stub_server(states)
+    server.start()
+    try:
+        assert server.wait_ready(20)
+        first = server.process
+        first.kill()
+        states.wait_for(2, LlamaServer.READY)
+        assert server.wait_ready(0)
+        assert server.process is not first
+        assert server.probe()
+        assert states.states == [LlamaServer.STARTING, LlamaServer.READY, LlamaServer.STARTING, LlamaServer.READY]
+    finally:
+        server.stop()
+
+def test_gives_up(free_port):
+    states = States()
+    command = [sys.executable, '-c', 'import sys; sys.exit(1)']
+    server = LlamaServer(port=free_port, command=command, probe_interval=0.1, max_restarts=1, on_state=states)
+    server.start()
+    try:
+        t0 = time.monotonic()
+        assert not server.wait_ready(30)
+        # Fails after one restart (2 s backoff), without waiting for the timeout.
+        assert time.monotonic() - t0 < 10
+        assert server.state == LlamaServer.FAILED
+        assert states.states[-1] == LlamaServer.FAILED
+        assert server.restarts == 2
+    finally:
+        server.stop()
+
+def test_not_ready_in_time(stub_server):
+    states = States()
+    server = stub_server(states, load_time=5, ready_timeout=0.5, max_restarts=0)
+    server.start()
+    try:
+        assert not server.wait_ready(20)
+        assert server.state == LlamaServer.FAILED
+    finally:
+        server.stop()
@@ -0,0 +1,161 @@
+import time
+
+import pytest
+
+import motion
+from PCA9685 import SimulatedPCA9685
+from robot_arm import RobotArm
+
+# Slack for the scheduler, on top of a tick.
+SLACK = 0.03
+
+class RecordingArm(RobotArm):
+    """Keeps (targets, pose, completed, written) at the end of every move, `written`: the driver has the targets."""
+    def __init__(self):
+        self.moves = []
+        super().__init__(pwm=SimulatedPCA9685(record=True))
+        # The gestures with every keyframe shortened to 0.1 s.
+        self.GESTURES = {name: keyframes and [(0.1, targets) for _, targets in keyframes]
+                         for name, keyframes in RobotArm.GESTURES.items()}
+        self.GESTURES["reach"] = [(2.0, {self.CH_BASE: 1000})]
+        self.GESTURES["turn"] = [(0.2, {self.CH_BASE: 1000, self.CH_JOINT2: 300})]
+
+    def move(self, targets, duration, cancellable=True):
+        completed = super().move(targets, duration, cancellable)
+        written = all(self.pwm.isServoPulse(ch, p) for ch, p in targets.items())
+        self.moves.append((dict(targets), dict(self.pose), completed, written))
+        return completed
+
+    def at_home(self):
+        return self.pose == self.HOME and all(self.pwm.isServoPulse(ch, p) for ch, p in self.HOME.items())
+
+@pytest.fixture
+def arm():
+    return RecordingArm()
+
+class Gestures:
+    """on_done of a MotionController: (name, start, end) of every gesture."""
+    def __init__(self):
+        self.done = []
+
+    def __call__(self, name, start, end):
+        self.done.append((name, start, end))
+
+    def names(self):
+        return [name for name, _, _ in self.done]
+
+def controller(arm, policy):
+    gestures = Gestures()
+    return motion.MotionController(arm, policy, on_done=gestures), gestures
+
+def test_keyframes_reach_their_targets(arm):
+    for name, keyframes in arm.GESTURES.items():
+        if not keyframes or name in ("reach", "turn"):
+            continue
+        del arm.moves[:]
+        arm.perform(name)
+        # Gestures end at HOME, there is no way back home to go.
+        assert len(arm.moves) == len(keyframes)
+        for (_, targets), (moved, pose, completed, written) in zip(keyframes, arm.moves):
+            assert moved == targets and completed and written
+            assert {ch: pose[ch] for ch in targets} == targets
+        assert arm.at_home()
+
+def test_keyframe_channels_move_on_the_same_tick(arm):
+    start = time.monotonic()
+    arm.play(arm.GESTURES["turn"])
+    writes = [(t, ch) for t, ch, _ in arm.pwm.log if t >= start]
+    # One tick: the writes of one setServoPulses call, a tick apart from the next.
+    ticks = []
+    for t, ch in writes:
+        if ticks and t - ticks[-1][0] < arm.TICK / 2:
+            ticks[-1][1].add(ch)
+        else:
+            ticks.append((t, {ch}))
+    assert len(ticks) == 10
+    assert all(channels == {arm.CH_BASE, arm.CH_JOINT2} for _, channels in ticks)
+    assert arm.pose[arm.CH_BASE] == 1000 and arm.pose[arm.CH_JOINT2] == 300
+
+def test_cancel_stops_within_a_tick(arm):
+    motions, gestures = controller(arm, motion.QUEUE)
+    assert motions.dispatch("reach")
+    time.sleep(0.3)
+    cancelled = time.monotonic()
+    motions.cancel()
+    motions.wait()
+    # The base turns further only until the cancel is seen, then goes back home.
+    base = [(t, p) for t, ch, p in arm.pwm.log if ch == arm.CH_BASE]
+    last_out = max(t for (t, p), (_, prev) in zip(base[1:], base) if p > prev)
+    assert last_out <= cancelled + arm.TICK + SLACK
+    assert gestures.names() == ["reach"]
+    assert gestures.done[0][2] - cancelled <= arm.HOME_TIME + arm.TICK + SLACK
+    assert arm.at_home()
+    motions.close()
+
+def test_queue_policy(arm):
+    motions, gestures = controller(arm, motion.QUEUE)
+    assert motions.dispatch("smile")
+    assert motions.dispatch("greet")
+    motions.wait()
+    assert gestures.names() == ["smile", "greet"]
+    (_, _, smile_end), (_, greet_start, _) = gestures.done
+    assert greet_start >= smile_end
+    assert all(completed for _, _, completed, _ in arm.moves)
+    assert arm.at_home()
+    motions.close()
+
+def test_cancel_policy(arm):
+    motions, gestures = controller(arm, motion.CANCEL)
+    assert motions.dispatch("reach")
+    time.sleep(0.2)
+    assert motions.dispatch("greet")
+    motions.wait()
+    assert gestures.names() == ["reach", "greet"]
+    (_, reach_start, reach_end), _ = gestures.done
+    # Cut short: well under its 2 s, plus the way home.
+    assert reach_end - reach_start < 2.0
+    assert not arm.moves[0][2]
+    assert all(completed for _, _, completed, _ in arm.moves[2:])
+    assert arm.at_home()
+    motions.close()
+
+def test_ignore_policy(arm):
+    motions, gestures = controller(arm, motion.IGNORE)
+    assert motions.dispatch("smile")
+    assert not motions.dispatch("greet")
+    motions.wait()
+    assert gestures.names() == ["smile"]
+    # Not busy any more, the next one runs.
+    assert motions.dispatch("greet")
+    motions.wait()
+    assert gestures.names() == ["smile", "greet"]
+    motions.close()
+
+def test_unknown_and_idle_commands(arm):
+    motions, gestures = controller(arm, motion.QUEUE)
+    assert not motions.dispatch("dance")
+    assert motions.dispatch("idle")
+    motions.wait()
+    assert gestures.names() == []
+    motions.close()
+
+def test_cancel_before_the_gesture_starts(arm):
+    motions, gestures = controller(arm, motion.QUEUE)
+    perform = arm.perform
+
+    def late_perform(name, cancelled=None):
+        # The cancel comes after the gesture was taken off the queue, before it runs.
+        motions.cancel()
+        perform(name, cancelled)
+    arm.perform = late_perform
+    assert motions.dispatch("greet")
+    motions.wait()
+    assert gestures.names() == ["greet"]
+    assert arm.moves == []
+    assert arm.at_home()
+    # A cancel doesn't carry over to the gestures dispatched after it.
+    arm.perform = perform
+    assert motions.dispatch("smile")
+    motions.wait()
+    assert len(arm.moves) == len(arm.GESTURES["smile"])
+    motions.close()
@@ -0,0 +1,51 @@
+import pytest
+
+from PCA9685 import PCA9685, FakeSMBus
+
+class FlakyBus(FakeSMBus):
+    """Fails the next `failures` block writes with OSError, like a glitch on the I2C bus."""
+    def __init__(self):
+        super().__init__()
+        self.failures = 0
+
+    def write_i2c_block_data(self, address, reg, data):
+        if self.failures:
+            self.failures -= 1
+            raise OSError(121, "Remote I/O error")
+        super().write_i2c_block_data(address, reg, data)
+
+def servo_off(bus, channel):
+    """The OFF count in the registers of `channel`."""
+    reg = 0x08 + 4 * channel
+    return bus.registers[reg] | bus.registers[reg + 1] << 8
+
+@pytest.fixture
+def pwm():
+    return PCA9685(bus=FlakyBus())
+
+def test_failed_write_retried(pwm):
+    pwm.setServoPulse(3, 1000)
+    pwm.bus.failures = 1
+    with pytest.raises(OSError):
+        pwm.setServoPulse(3, 1500)
+    assert not pwm.isServoPulse(3, 1500)
+    pwm.setServoPulse(3, 1500)
+    assert servo_off(pwm.bus, 3) == PCA9685.servoOff(1500)
+    assert pwm.isServoPulse(3, 1500)
+
+def test_failed_block_retried(pwm):
+    pwm.setServoPulses({0: 500, 1: 500, 2: 500})
+    pwm.bus.failures = 1
+    with pytest.raises(OSError):
+        pwm.setServoPulses({0: 1500, 1: 1500, 2: 1500})
+    assert not any(pwm.isServoPulse(ch, 1500) for ch in range(3))
+    pwm.setServoPulses({0: 1500, 1: 1500, 2: 1500})
+    assert [servo_off(pwm.bus, ch) for ch in range(3)] == [PCA9685.servoOff(1500)] * 3
+
+def test_failed_all_channels_write_retried(pwm):
+    pwm.setServoPulse(5, 1000)
+    pwm.bus.failures = 1
+    with pytest.raises(OSError):
+        pwm.setAllPWM(0, 0)
+    # Not known to be written any more, so it is written again.
+    assert not pwm.isServoPulse(5, 1000)
@@ -0,0 +1,101 @@
+import time
+
+import pytest
+
+from response_cache import CachedResponse, ResponseCache, normalize_transcript
+
+CONTEXT = [{"role": "system", "content": "You are Skyler."}]
+
+def response(i=0):
+    pcm = bytes((i + j) % 256 for j in range(1000))
+    return CachedResponse(f"Reply {i}. $greet", "greet", [
+        (f"Reply {i}.", "en", 22050, pcm),
+        ("Unspoken.", "en", None, None),
+        ("Quiet.", "en", 22050, b"\0" * 4410),
+    ])
+
+@pytest.fixture
+def cache():
+    cache = ResponseCache()
+    yield cache
+    cache.close()
+
+def test_normalize_transcript():
+    assert normalize_transcript("  Hello,  World! ") == "hello world"
+    assert normalize_transcript("What's your name?") == normalize_transcript("what s your name")
+    assert normalize_transcript("你好！") == "你好"
+
+def test_key():
+    key = ResponseCache.key("Hello!", CONTEXT, "en")
+    assert ResponseCache.key(" hello. ", CONTEXT, "en") == key
+    assert ResponseCache.key("Hello!", CONTEXT + [{"role": "user", "content": "hi"}], "en") != key
+    assert ResponseCache.key("Hello!", CONTEXT, "zh") != key
+    assert ResponseCache.key("Goodbye!", CONTEXT, "en") != key
+
+def test_audio_round_trip(cache):
+    key = cache.key("hello", CONTEXT)
+    assert cache.get(key) is None
+    cache.put(key, response())
+    # The audio of every sentence comes back from the one compressed blob, None stays None.
+    assert cache.get(key) == response()
+    assert (cache.hits, cache.misses) == (1, 1)
+    audio, = cache.db.execute("SELECT audio FROM responses").fetchone()
+    assert len(audio) < 1000 + 4410
+
+def test_least_recently_used_evicted():
+    cache = ResponseCache(max_entries=2)
+    cache.put("a", response(1))
+    cache.put("b", response(2))
+    assert cache.get("a")
+    cache.put("c", response(3))
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a") == response(1)
+    assert cache.get("c")
+    cache.close()
+
+def test_expired(cache):
+    cache.ttl = 0.05
+    cache.put("a", response())
+    assert cache.get("a")
+    time.sleep(0.1)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+def test_reloaded_from_file(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = ResponseCache(path)
+    stored = [response(i) for i in range(3)]
+    for i, r in enumerate(stored):
+        cache.put(f"k{i}", r)
+    # k0 is now the most recently used.
+    cache.get("k0")
+    cache.close()
+
+    cache = ResponseCache(path)
+    assert len(cache) == 3
+    assert [cache.get(f"k{i}") for i in range(3)] == stored
+    cache.close()
+
+    # Fewer entries allowed after a restart: the least recently used go.
+    cache = ResponseCache(path, max_entries=1)
+    assert len(cache) == 1
+    assert cache.get("k2") == stored[2]
+    cache.close()
+
+def test_expired_on_reload(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = ResponseCache(path)
+    cache.put("a", response())
+    cache.close()
+    time.sleep(0.1)
+    cache = ResponseCache(path, ttl=0.05)
+    assert len(cache) == 0
+    assert cache.get("a") is None
+    cache.close()
+
+def test_clear(cache):
+    cache.put("a", response())
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.get("a") is None
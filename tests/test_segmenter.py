@@ -0,0 +1,77 @@
+from segmenter import SentenceSegmenter
+
+def segment(chunks):
+    segmenter = SentenceSegmenter()
+    sentences = []
+    for chunk in chunks:
+        sentences += segmenter.feed(chunk)
+    sentences += segmenter.flush()
+    return sentences, segmenter
+
+def test_ascii_stops():
+    sentences, segmenter = segment(["Hello there! How are you? Fine."])
+    assert sentences == ["Hello there!", "How are you?", "Fine."]
+    assert segmenter.command is None
+
+def test_cjk_stops():
+    sentences, _ = segment(["你好！我是Skyler。有什么可以帮你？"])
+    assert sentences == ["你好！", "我是Skyler。", "有什么可以帮你？"]
+
+def test_decimal_number_does_not_split():
+    sentences, _ = segment(["It weighs 3.5 kilos. That's heavy."])
+    assert sentences == ["It weighs 3.5 kilos.", "That's heavy."]
+
+def test_fed_in_chunks():
+    text = "Sure, here you go. Let me hand it over to you! Anything else?"
+    chunked, _ = segment([text[i:i + 3] for i in range(0, len(text), 3)])
+    whole, _ = segment([text])
+    assert chunked == whole == ["Sure, here you go.", "Let me hand it over to you!", "Anything else?"]
+
+def test_sentence_completed_by_the_following_space():
+    segmenter = SentenceSegmenter()
+    assert segmenter.feed("Hello there.") == []
+    assert segmenter.feed(" Nice") == ["Hello there."]
+    assert segmenter.flush() == ["Nice"]
+
+def test_command_split_across_chunks():
+    segmenter = SentenceSegmenter()
+    assert segmenter.feed("Nice to meet you! $") == ["Nice to meet you!"]
+    assert segmenter.command is None
+    segmenter.feed("gr")
+    assert segmenter.command == "gr" and not segmenter.command_done
+    segmenter.feed("eet")
+    assert segmenter.command == "greet" and not segmenter.command_done
+    assert segmenter.flush() == []
+    assert segmenter.command == "greet" and segmenter.command_done
+
+def test_command_done_at_the_end_of_the_word():
+    segmenter = SentenceSegmenter()
+    segmenter.feed("Hi! $smile")
+    assert not segmenter.command_done
+    segmenter.feed("\n")
+    assert segmenter.command == "smile" and segmenter.command_done
+
+def test_dollar_amount_is_not_a_command():
+    sentences, segmenter = segment(["That costs about $5. Here you go! $retrieve"])
+    assert sentences == ["That costs about $5.", "Here you go!"]
+    assert segmenter.command == "retrieve"
+
+def test_dollar_amount_split_across_chunks():
+    sentences, segmenter = segment(["That costs $", "5. Here you go! $", "retrieve"])
+    assert sentences == ["That costs $5.", "Here you go!"]
+    assert segmenter.command == "retrieve"
+
+def test_later_command_replaces_the_earlier_one():
+    sentences, segmenter = segment(["$greet Hello there! $smile"])
+    assert sentences == ["Hello there!"]
+    assert segmenter.command == "smile"
+
+def test_text_after_the_command_is_spoken():
+    sentences, segmenter = segment(["Here you go. $retrieve Anything else?"])
+    assert sentences == ["Here you go.", "Anything else?"]
+    assert segmenter.command == "retrieve" and segmenter.command_done
+
+def test_dollar_at_the_end():
+    sentences, segmenter = segment(["It's free, no $"])
+    assert sentences == ["It's free, no $"]
+    assert segmenter.command is None
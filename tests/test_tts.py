@@ -0,0 +1,51 @@
+import sys
+
+import pytest
+
+from tts import AudioSink, TTSService
+
+SAMPLE_RATE = 22050
+
+# A player that takes the audio only as fast as it plays, like aplay.
+SLOW_PLAYER = """
+import sys, time
+total, t0 = 0, time.monotonic()
+while True:
+    data = sys.stdin.buffer.read(4096)
+    if not data:
+        break
+    total += len(data)
+    time.sleep(max(0, t0 + total / (2 * {rate}) - time.monotonic()))
+"""
+
+def stub_bytes(text):
+    # What tools/piper_stub.py writes for one line.
+    samples = int((len(text) * 0.06 + 0.2) * SAMPLE_RATE)
+    return samples // 4 * 4 * 2
+
+@pytest.fixture
+def service(monkeypatch, tool_command):
+    monkeypatch.setenv('PIPER_STUB_LOAD', '0')
+    monkeypatch.setenv('PIPER_STUB_RTF', '0.05')
+    service = TTSService({'en': 'stub.onnx'}, tool_command('piper_stub.py'), player=None, keep_audio=True)
+    sink = AudioSink(SAMPLE_RATE, [sys.executable, '-c', SLOW_PLAYER.format(rate=SAMPLE_RATE)])
+    service.voices['en'].sink = sink
+    service.sinks = {SAMPLE_RATE: sink}
+    service.start(warmup=False)
+    yield service
+    service.close()
+
+def test_long_sentence_keeps_all_its_audio(service):
+    # More audio than the player pipe holds while it plays.
+    long_text = "x" * 60
+    first = service.speak(long_text, 'en', block=False)
+    second = service.speak("Short one.", 'en', block=True)
+    assert first.audio_bytes == stub_bytes(long_text)
+    assert len(first.audio) == first.audio_bytes
+    assert second.audio_bytes == stub_bytes("Short one.")
+
+def test_blocking_speak_returns_after_playback(service):
+    text = "x" * 40
+    utt = service.speak(text, 'en', block=True)
+    assert utt.audio_bytes == stub_bytes(text)
+    assert utt.played_until >= utt.first_audio + stub_bytes(text) / 2 / SAMPLE_RATE - 0.05
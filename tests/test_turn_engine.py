@@ -0,0 +1,74 @@
+import pytest
+
+import backends
+from backends import FakeBackend
+from LlamaPi import LlamaPiBase
+
+class App(LlamaPiBase):
+    """The turn engine on a FakeBackend, speaking into a list."""
+    def __init__(self, backend):
+        super().__init__()
+        self.fake_backend = backend
+        self.spoken = []
+        self.commands = []
+        self.add_listener(lambda kind, data: self.commands.append(data) if kind == 'command' else None)
+
+    def create_backend(self):
+        return self.fake_backend
+
+    def say(self, text, lang='en'):
+        self.spoken.append(text)
+
+class ScriptedBackend(FakeBackend):
+    """Streams `reply` word by word, and fails with LLMBackendError after `fail_after` words."""
+    def __init__(self, reply, fail_after=None):
+        super().__init__()
+        self.script = reply
+        self.fail_after = fail_after
+
+    def reply(self, request):
+        return self.script
+
+    def stream(self, messages):
+        for i, token in enumerate(super().stream(messages)):
+            if i == self.fail_after:
+                raise backends.LLMBackendError("connection lost")
+            yield token
+
+@pytest.fixture
+def app(request):
+    app = App(getattr(request, 'param', None) or FakeBackend())
+    app.prepare_llm()
+    assert app.llm_ready
+    yield app
+    app.cleanup()
+
+def test_reply_spoken_sentence_by_sentence(app):
+    assert app.llm("hello") == "greet"
+    assert app.spoken == ["Hello there!", "I'm Skyler, nice to meet you."]
+    assert app.commands == ["greet"]
+
+@pytest.mark.parametrize('app', [ScriptedBackend("Sure. $greet Nice to meet you.")], indirect=True)
+def test_command_dispatched_once(app):
+    # Dispatched as soon as the command is complete, not again at the end of the reply.
+    assert app.llm("hello") == "greet"
+    assert app.commands == ["greet"]
+    assert app.spoken == ["Sure.", "Nice to meet you."]
+
+def test_history_updated(app):
+    app.llm("hello")
+    app.llm("I'm happy")
+    assert len(app.history) == 2
+    assert [m["content"] for m in app.history.messages()] == [
+        "hello", FakeBackend.REPLIES[0][1], "I'm happy", FakeBackend.REPLIES[3][1]]
+    assert app.backend.requests == ["hello", "I'm happy"]
+
+@pytest.mark.parametrize('app', [ScriptedBackend("Hello there! I'm Skyler, nice to meet you. $greet", fail_after=4)],
+                         indirect=True)
+def test_backend_error(app):
+    assert app.llm("hello") is None
+    # What streamed before the error is still spoken, the command never came.
+    assert app.spoken == ["Hello there!", "I'm Skyler,"]
+    assert app.commands == []
+    # The broken reply is not sent along with the next request.
+    assert len(app.history) == 0
@@ -0,0 +1,104 @@
+import time
+import types
+
+import numpy as np
+import pytest
+
+from asr import AudioBuffer, StreamingTranscriber
+from vad import EnergyVAD
+
+RATE = 16000
+
+def speech(seconds, seed=0):
+    """Noise with a syllable-rate envelope: loud all the time, but never steady."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * RATE)) / RATE
+    envelope = 0.75 + 0.25 * np.sin(2 * np.pi * 4 * t)
+    return (0.3 * envelope * rng.standard_normal(len(t))).clip(-1, 1).astype(np.float32)
+
+def tone(seconds, freq=440):
+    t = np.arange(int(seconds * RATE)) / RATE
+    return (0.3 * np.sin(2 * np.pi * freq * t)).astype(np.float32)
+
+def noise(seconds, level=0.002, seed=1):
+    """Background noise of a quiet room (about -54 dB)."""
+    return (level * np.random.default_rng(seed).standard_normal(int(seconds * RATE))).astype(np.float32)
+
+def silence(seconds):
+    return np.zeros(int(seconds * RATE), dtype=np.float32)
+
+@pytest.fixture
+def vad():
+    return EnergyVAD(RATE)
+
+def test_continuous_speech(vad):
+    audio = speech(3)
+    assert vad.speech_bounds(audio) == (0, len(audio))
+    assert vad.trim(audio)[1] < 0.05
+
+def test_tone(vad):
+    audio = tone(2)
+    assert vad.speech_bounds(audio) == (0, len(audio))
+
+def test_silence(vad):
+    assert vad.speech_bounds(silence(2)) is None
+    assert vad.speech_bounds(noise(2)) is None
+
+def test_silence_then_speech(vad):
+    audio = np.concatenate([noise(1), speech(2)])
+    start, end = vad.speech_bounds(audio)
+    assert abs(start - (RATE - vad.padding)) <= vad.frame_size
+    assert end == len(audio)
+
+def test_speech_then_noise(vad):
+    audio = np.concatenate([speech(4), noise(1)])
+    start, end = vad.speech_bounds(audio)
+    assert start == 0
+    assert abs(end - (4 * RATE + vad.padding)) <= vad.frame_size
+
+class FakeWhisper:
+    """Transcribes any audio as one segment, and keeps the length of every decoded window."""
+    def __init__(self):
+        self.decoded = []
+
+    def transcribe(self, audio, beam_size=5, initial_prompt=None, **kwargs):
+        self.decoded.append(len(audio) / RATE)
+        segment = types.SimpleNamespace(text=" words", start=0.0, end=len(audio) / RATE)
+        return iter([segment]), types.SimpleNamespace(language="en")
+
+def stream(audio, chunk=0.1):
+    """Feed `audio` to a StreamingTranscriber with an energy VAD, a bit faster than real time."""
+    model = FakeWhisper()
+    transcriber = StreamingTranscriber(model, AudioBuffer(RATE), interval=0.05, vad=EnergyVAD(RATE))
+    transcriber.start()
+    pcm = (audio * 32767).astype(np.int16)
+    step = int(chunk * RATE)
+    for i in range(0, len(pcm), step):
+        transcriber.feed(pcm[i:i + step].tobytes())
+        time.sleep(0.01)
+    text, _ = transcriber.finish()
+    return transcriber, model, text
+
+def test_streaming_keeps_speech_from_the_key_press():
+    transcriber, model, text = stream(np.concatenate([speech(4), noise(1)]))
+    assert text
+    # The last decode covers all of the speech, only noise is dropped.
+    assert model.decoded[-1] >= 4.0
+    assert transcriber.dropped_seconds() <= 1.0
+
+def test_streaming_skips_leading_silence():
+    transcriber, model, text = stream(np.concatenate([silence(1), speech(2)]))
+    assert text
+    assert model.decoded[-1] >= 2.0
+    assert 0.6 <= transcriber.dropped_seconds() <= 1.0
+
+def test_streaming_tone():
+    transcriber, model, _ = stream(tone(2))
+    assert model.decoded[-1] >= 2.0 - 1 / 30
+    assert transcriber.dropped_seconds() <= 1 / 30
+
+def test_streaming_silence():
+    transcriber, model, text = stream(silence(2))
+    assert text == ""
+    assert model.decoded == []
+    assert transcriber.dropped_seconds() == 2.0
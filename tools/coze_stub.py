@@ -0,0 +1,187 @@
+"""
+Stand-in for the Coze v3 chat API, for testing and benchmarking without an API key.
+
+Serves the parts of the API that `CozeBotWrapper` uses:
+    POST /v3/chat                (`stream: false`: returns the chat in progress,
+                                  `stream: true`: server-sent events)
+    GET  /v3/chat/retrieve       (status, 'completed' once the reply is "generated")
+    GET  /v3/chat/message/list
+
+Usage:
+    python tools/coze_stub.py --port 8001 --token-time 0.05
+    python tools/coze_stub.py --port 8443 --certfile cert.pem --keyfile key.pem   (HTTPS)
+    python tools/coze_stub.py --fail chat        (streamed chats fail after the first token)
+"""
+import argparse
+import json
+import ssl
+import sys
+import threading
+import time
+import urllib.parse
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from llm_stub import make_reply, tokenize
+
+class Handler(BaseHTTPRequestHandler):
+    # Keep-alive, like the real API.
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes, don't let them wait for a delayed ACK.
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        if self.server.args.verbose:
+            sys.stderr.write("coze_stub: " + (format % args) + "\n")
+
+    def _json(self, obj, status=200):
+        body = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _chat(self, chat, status):
+        return {
+            "id": chat["id"], "conversation_id": chat["conversation_id"], "bot_id": chat["bot_id"],
+            "created_at": int(chat["created_at"]), "status": status, "last_error": {"code": 0, "msg": ""},
+        }
+
+    def _message(self, chat, content, type="answer"):
+        return {
+            "id": uuid.uuid4().hex, "chat_id": chat["id"], "conversation_id": chat["conversation_id"],
+            "bot_id": chat["bot_id"], "role": "assistant", "type": type,
+            "content": content, "content_type": "text",
+        }
+
+    def _authorized(self):
+        if not self.headers.get("Authorization", "").startswith("Bearer "):
+            self._json({"code": 4100, "msg": "authentication is invalid"}, 401)
+            return False
+        return True
+
+    def do_GET(self):
+        if self._authorized():
+            self._query(urllib.parse.urlparse(self.path))
+
+    def _query(self, url):
+        params = dict(urllib.parse.parse_qsl(url.query))
+        chat = self.server.chats.get(params.get("chat_id"))
+        time.sleep(self.server.args.latency)
+        if chat is None:
+            self._json({"code": 4200, "msg": "chat not found"})
+        elif url.path == "/v3/chat/retrieve":
+            done = time.time() >= chat["done_at"]
+            self._json({"code": 0, "msg": "", "data": self._chat(chat, "completed" if done else "in_progress")})
+        elif url.path == "/v3/chat/message/list":
+            self._json({"code": 0, "msg": "", "data": [self._message(chat, chat["reply"])]})
+        else:
+            self._json({"code": 4000, "msg": "not found"}, 404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if not self._authorized():
+            return
+        url = urllib.parse.urlparse(self.path)
+        if url.path != "/v3/chat":
+            # Retrieve and message list can be POSTed too.
+            self._query(url)
+            return
+
+        args = self.server.args
+        params = dict(urllib.parse.parse_qsl(url.query))
+        messages = request.get("additional_messages", [])
+        reply = make_reply(messages)
+        tokens = tokenize(reply)
+        chat = {
+            "id": uuid.uuid4().hex,
+            "conversation_id": params.get("conversation_id") or uuid.uuid4().hex,
+            "bot_id": request.get("bot_id"),
+            "created_at": time.time(),
+            "reply": reply,
+        }
+        chat["done_at"] = chat["created_at"] + args.first_token_time + len(tokens) * args.token_time
+        with self.server.lock:
+            self.server.chats[chat["id"]] = chat
+        time.sleep(args.latency)
+
+        if not request.get("stream"):
+            self._json({"code": 0, "msg": "", "data": self._chat(chat, "in_progress")})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send(event, data):
+            if args.multiline_data:
+                # Allowed by SSE: the data lines of an event are joined with newlines.
+                data = "\n".join(f"data:{line}" for line in json.dumps(data, indent=1).split("\n"))
+            else:
+                data = f"data:{json.dumps(data)}"
+            payload = f"event:{event}\n{data}\n\n".encode()
+            self.wfile.write(f"{len(payload):x}\r\n".encode() + payload + b"\r\n")
+            self.wfile.flush()
+
+        send("conversation.chat.created", self._chat(chat, "created"))
+        send("conversation.chat.in_progress", self._chat(chat, "in_progress"))
+        time.sleep(args.first_token_time)
+        for i, token in enumerate(tokens):
+            if i == 1 and args.fail:
+                if args.fail == "chat":
+                    failed = self._chat(chat, "failed")
+                    failed["last_error"] = {"code": 5000, "msg": "stub failure"}
+                    send("conversation.chat.failed", failed)
+                else:
+                    send("error", {"code": 4000, "msg": "stub error"})
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+                return
+            send("conversation.message.delta", self._message(chat, token))
+            time.sleep(args.token_time)
+        send("conversation.message.completed", self._message(chat, reply))
+        send("conversation.message.completed", self._message(
+            chat, '{"msg_type":"generate_answer_finish","data":"{\\"finish_reason\\":0}"}', "verbose"))
+        send("conversation.chat.completed", self._chat(chat, "completed"))
+        send("done", "[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in for the Coze v3 chat API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.0, help="added to every response")
+    parser.add_argument("--first-token-time", type=float, default=0.5)
+    parser.add_argument("--token-time", type=float, default=0.05, help="seconds per generated token")
+    parser.add_argument("--fail", choices=["chat", "error"],
+                        help="end streamed chats after the first token with a conversation.chat.failed or an error event")
+    parser.add_argument("--multiline-data", action="store_true", help="spread the JSON of every event over several data: lines")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    parser.add_argument("--certfile", help="serve HTTPS with this certificate")
+    parser.add_argument("--keyfile")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    server.args = args
+    server.chats = {}
+    server.lock = threading.Lock()
+    scheme = "http"
+    if args.certfile:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(args.certfile, args.keyfile)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        scheme = "https"
+    sys.stderr.write(f"coze_stub: listening on {scheme}://{args.host}:{args.port}/v3\n")
+    sys.stderr.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
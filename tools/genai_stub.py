@@ -0,0 +1,56 @@
+"""
+Stand-in for the `google.generativeai` module, for testing and benchmarking the Gemini
+backend without an API key:
+
+    GeminiBackend("fake", system_inst, client=FakeGenAI("Hello there! $greet"))
+"""
+import time
+import types
+
+class NoTextChunk:
+    """A chunk with only the finish reason or safety ratings: `.text` raises, like in google.generativeai."""
+    @property
+    def text(self):
+        raise ValueError("The `response.text` quick accessor only works for simple (single-`Part`) text responses")
+
+class FakeGenAI:
+    """
+    Stands in for the `google.generativeai` module in `GeminiWrapper`. Replies with `reply`,
+    generated at `token_time` per token and streamed in chunks of `chunk_tokens` tokens,
+    like Gemini does. With `no_text_chunks`, a chunk without text follows every chunk.
+    `streamed` counts the chunks streamed so far.
+    """
+    def __init__(self, reply, first_token_time=0.0, token_time=0.0, chunk_tokens=8, no_text_chunks=False):
+        self.reply = reply
+        self.first_token_time = first_token_time
+        self.token_time = token_time
+        self.chunk_tokens = chunk_tokens
+        self.no_text_chunks = no_text_chunks
+        self.streamed = 0
+
+    def configure(self, api_key=None):
+        pass
+
+    def GenerativeModel(self, model_name=None, generation_config=None, system_instruction=None):
+        return self
+
+    def start_chat(self, history=None):
+        return self
+
+    def send_message(self, message, stream=False):
+        tokens = [self.reply[i:i + 4] for i in range(0, len(self.reply), 4)]
+        chunks = ["".join(tokens[i:i + self.chunk_tokens]) for i in range(0, len(tokens), self.chunk_tokens)]
+        if not stream:
+            time.sleep(self.first_token_time + len(tokens) * self.token_time)
+            return types.SimpleNamespace(text=self.reply)
+
+        def generate():
+            self.streamed = 0
+            time.sleep(self.first_token_time)
+            for chunk in chunks:
+                time.sleep(self.chunk_tokens * self.token_time)
+                self.streamed += 1
+                yield types.SimpleNamespace(text=chunk)
+                if self.no_text_chunks:
+                    yield NoTextChunk()
+        return generate()
@@ -0,0 +1,128 @@
+"""
+Stand-in for `llama_cpp.server`, for testing and benchmarking without a model.
+
+Serves the parts of the OpenAI API that LlamaPi uses:
+    GET  /v1/models
+    POST /v1/chat/completions   (streaming and non-streaming)
+    POST /extras/tokenize       (words as tokens)
+
+Usage:
+    python tools/llm_stub.py --port 8000 --load-time 5 --token-time 0.05
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from backends import FakeBackend
+
+# The same canned replies as the in-process FakeBackend.
+REPLIES = FakeBackend.REPLIES
+DEFAULT_REPLY = FakeBackend.DEFAULT_REPLY
+
+def make_reply(messages):
+    request = messages[-1]["content"].lower() if messages else ""
+    for keyword, reply in REPLIES:
+        if keyword in request:
+            return reply
+    return DEFAULT_REPLY
+
+def tokenize(text):
+    # Roughly what a BPE tokenizer would stream: words with their leading space.
+    tokens = []
+    for i, word in enumerate(text.split(" ")):
+        tokens.append(word if i == 0 else " " + word)
+    return tokens
+
+class Handler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        sys.stderr.write("llm_stub: " + (format % args) + "\n")
+
+    def _json(self, obj, status=200):
+        body = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.startswith("/v1/models"):
+            self._json({"object": "list", "data": [{"id": "gpt-3.5-turbo", "object": "model", "owned_by": "me"}]})
+        else:
+            self._json({"detail": "Not Found"}, 404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if self.path.startswith("/extras/tokenize"):
+            self._json({"tokens": list(range(len(tokenize(request.get("input", "")))))})
+            return
+        if not self.path.startswith("/v1/chat/completions"):
+            self._json({"detail": "Not Found"}, 404)
+            return
+
+        args = self.server.args
+        messages = request.get("messages", [])
+        reply = make_reply(messages)
+        prompt_chars = sum(len(m.get("content", "")) for m in messages)
+        time.sleep(prompt_chars * args.prefill_time_per_char)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+
+        if not request.get("stream"):
+            time.sleep(len(tokenize(reply)) * args.token_time)
+            self._json({
+                "id": completion_id, "object": "chat.completion", "created": created, "model": request.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        def send(delta, finish_reason=None):
+            chunk = {
+                "id": completion_id, "object": "chat.completion.chunk", "created": created,
+                "model": request.get("model"),
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+
+        send({"role": "assistant"})
+        for token in tokenize(reply):
+            time.sleep(args.token_time)
+            send({"content": token})
+        send({}, "stop")
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stand-in for llama_cpp.server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--load-time", type=float, default=2.0, help="simulated model load before listening")
+    parser.add_argument("--token-time", type=float, default=0.05, help="seconds per generated token")
+    parser.add_argument("--prefill-time-per-char", type=float, default=0.0, help="simulated prompt processing")
+    args = parser.parse_args()
+
+    time.sleep(args.load_time)
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    server.args = args
+    # Same line as uvicorn prints, for anything that still waits for it.
+    sys.stderr.write(f"INFO:     Uvicorn running on http://{args.host}:{args.port}\n")
+    sys.stderr.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
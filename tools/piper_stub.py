@@ -0,0 +1,49 @@
+"""
+Stand-in for the piper binary, for testing and benchmarking without a voice model.
+
+Accepts the same command line as piper (`-m <model> --output-raw`), simulates the
+model load once at startup, then for every line on stdin writes silence to stdout
+and logs the same "Real-time factor" line as piper on stderr.
+
+Timings can be tuned with environment variables:
+    PIPER_STUB_LOAD     model load time in seconds (default 1.0)
+    PIPER_STUB_RTF      synthesis time / audio time (default 0.2)
+"""
+import argparse
+import os
+import sys
+import time
+
+SAMPLE_RATE = 22050
+SECONDS_PER_CHAR = 0.06
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-m', '--model')
+    parser.add_argument('--output-raw', '--output_raw', action='store_true')
+    parser.add_argument('--sentence_silence', type=float, default=0.2)
+    args, _ = parser.parse_known_args()
+
+    time.sleep(float(os.environ.get('PIPER_STUB_LOAD', '1.0')))
+    rtf = float(os.environ.get('PIPER_STUB_RTF', '0.2'))
+
+    out = sys.stdout.buffer
+    for line in sys.stdin:
+        text = line.strip()
+        if not text:
+            continue
+        audio_seconds = len(text) * SECONDS_PER_CHAR + args.sentence_silence
+        infer_seconds = audio_seconds * rtf
+        # Piper streams the audio in a few chunks as it is synthesized.
+        num_chunks = 4
+        samples = int(audio_seconds * SAMPLE_RATE)
+        for _ in range(num_chunks):
+            time.sleep(infer_seconds / num_chunks)
+            out.write(b'\x00\x00' * (samples // num_chunks))
+            out.flush()
+        sys.stderr.write(f"[piper] [info] Real-time factor: {rtf} "
+                         f"(infer={infer_seconds:.2f} sec, audio={audio_seconds:.2f} sec)\n")
+        sys.stderr.flush()
+
+if __name__ == '__main__':
+    main()
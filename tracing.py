@@ -0,0 +1,183 @@
+import collections
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logging.basicConfig(
+    format='%(asctime)s [%(levelname)s] %(filename)s:%(funcName)s: %(message)s',
+    level=logging.DEBUG,
+    handlers=[
+        logging.StreamHandler()  # Output logs to stdout
+    ]
+)
+
+class Span:
+    def __init__(self, turn, name, start=None, **attrs):
+        self.turn = turn
+        self.name = name
+        self.start = time.monotonic() if start is None else start
+        self.end_time = None
+        self.attrs = attrs
+
+    def end(self, end=None, **attrs):
+        if self.end_time is None:
+            self.end_time = time.monotonic() if end is None else end
+            self.attrs.update(attrs)
+            if self.turn:
+                self.turn.spans.append(self)
+
+    def duration(self):
+        return (self.end_time or time.monotonic()) - self.start
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.end()
+
+    def to_dict(self, origin):
+        d = {"name": self.name, "start": self.start - origin, "duration": self.duration()}
+        d.update(self.attrs)
+        return d
+
+class NullSpan:
+    """What the tracer hands out when it is off: does nothing, costs next to nothing."""
+    def end(self, end=None, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+NULL_SPAN = NullSpan()
+
+class Turn:
+    def __init__(self, turn_id):
+        self.id = turn_id
+        self.wall_start = time.time()
+        self.start = time.monotonic()
+        self.end_time = None
+        self.spans = []
+
+    def to_dict(self):
+        return {
+            "turn": self.id,
+            "start": self.wall_start,
+            "duration": (self.end_time or time.monotonic()) - self.start,
+            "spans": [s.to_dict(self.start) for s in sorted(self.spans, key=lambda s: s.start)],
+        }
+
+class Tracer:
+    """
+    Timed spans for every voice turn (capture, transcribe, LLM, TTS, robot, ...).
+
+    The last `max_turns` turns are kept in a ring buffer. Finished turns can be appended
+    to a JSON lines file, and `serve` exposes `/metrics` (Prometheus text format, span
+    count and total seconds per span name) and `/turns` (recent turns as JSON lines).
+    When disabled, `span`/`begin` return a shared no-op span.
+    """
+    def __init__(self, enabled: bool = False, max_turns: int = 50, jsonl_file: str = None):
+        self.enabled = enabled
+        self.turns = collections.deque(maxlen=max_turns)
+        self.jsonl_file = jsonl_file
+        self.current = None
+        self.next_id = 1
+        self.lock = threading.Lock()
+        # Aggregates over all turns, for /metrics.
+        self.span_count = collections.Counter()
+        self.span_seconds = collections.Counter()
+        self.server = None
+
+    def start_turn(self):
+        if not self.enabled:
+            return
+        with self.lock:
+            if self.current:
+                self._finish(self.current)
+            self.current = Turn(self.next_id)
+            self.next_id += 1
+
+    def end_turn(self):
+        if not self.enabled or not self.current:
+            return
+        with self.lock:
+            turn, self.current = self.current, None
+            self._finish(turn)
+
+    def _finish(self, turn):
+        turn.end_time = time.monotonic()
+        self.turns.append(turn)
+        for s in turn.spans:
+            self.span_count[s.name] += 1
+            self.span_seconds[s.name] += s.duration()
+        self.span_count["turn"] += 1
+        self.span_seconds["turn"] += turn.end_time - turn.start
+        if self.jsonl_file:
+            with open(self.jsonl_file, 'a') as f:
+                f.write(json.dumps(turn.to_dict()) + "\n")
+
+    def begin(self, name, **attrs):
+        """Start a span, call `end()` on it when done."""
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self.current, name, **attrs)
+
+    # Same thing, reads better in a `with` statement.
+    span = begin
+
+    def add_span(self, name, start, end, **attrs):
+        """Record a span that was timed elsewhere (time.monotonic() timestamps)."""
+        if not self.enabled:
+            return
+        Span(self.current, name, start, **attrs).end(end)
+
+    def export_jsonl(self):
+        with self.lock:
+            return "".join(json.dumps(t.to_dict()) + "\n" for t in self.turns)
+
+    def prometheus(self):
+        lines = ["# TYPE llamapi_span_seconds summary"]
+        with self.lock:
+            for name in sorted(self.span_count):
+                lines.append(f'llamapi_span_seconds_count{{span="{name}"}} {self.span_count[name]}')
+                lines.append(f'llamapi_span_seconds_sum{{span="{name}"}} {self.span_seconds[name]:.6f}')
+            if self.turns:
+                lines.append("# TYPE llamapi_last_turn_seconds gauge")
+                last = self.turns[-1]
+                lines.append(f"llamapi_last_turn_seconds {last.end_time - last.start:.6f}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port: int = 9100, host: str = '127.0.0.1'):
+        tracer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.startswith('/metrics'):
+                    body, content_type = tracer.prometheus(), 'text/plain; version=0.0.4'
+                elif self.path.startswith('/turns'):
+                    body, content_type = tracer.export_jsonl(), 'application/x-ndjson'
+                else:
+                    self.send_error(404)
+                    return
+                body = body.encode()
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        logging.info(f"Metrics on http://{host}:{port}/metrics")
+
+    def close(self):
+        if self.server:
+            self.server.shutdown()
+            self.server = None
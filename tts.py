@@ -0,0 +1,366 @@
+import fcntl
+import json
+import logging
+import os
+import queue
+import re
+import select
+import struct
+import subprocess
+import termios
+import threading
+import time
+
+logging.basicConfig(
+    format='%(asctime)s [%(levelname)s] %(filename)s:%(funcName)s: %(message)s',
+    level=logging.DEBUG,
+    handlers=[
+        logging.StreamHandler()  # Output logs to stdout
+    ]
+)
+
+def voice_sample_rate(model: str, default: int = 22050) -> int:
+    # Piper keeps the voice settings next to the model, e.g. `en_US-amy-medium.onnx.json`.
+    try:
+        with open(model + '.json') as f:
+            return json.load(f)['audio']['sample_rate']
+    except (OSError, KeyError, ValueError):
+        return default
+
+class AudioSink:
+    """
+    One long-lived player process fed with raw 16-bit mono PCM.
+
+    Writes never block: the audio is queued and a feeder thread writes it to the player,
+    which only takes it as fast as it plays. A playback clock (`play_until`) tells when the
+    audio written so far has actually been played.
+    With `command=None` the audio is discarded but the clock still runs (for benchmarks).
+    """
+    def __init__(self, sample_rate: int = 22050, command=None):
+        self.sample_rate = sample_rate
+        self.play_until = 0.0
+        self.lock = threading.Lock()
+        self.process = None
+        self.queue = queue.Queue()
+        self.feeder = None
+        if command:
+            self.process = subprocess.Popen(command, stdin=subprocess.PIPE)
+            self.feeder = threading.Thread(target=self._feed, daemon=True)
+            self.feeder.start()
+
+    @classmethod
+    def aplay(cls, sample_rate: int = 22050):
+        return cls(sample_rate, ['aplay', '-r', str(sample_rate), '-f', 'S16_LE', '-t', 'raw', '-'])
+
+    def write(self, pcm: bytes):
+        with self.lock:
+            now = time.monotonic()
+            self.play_until = max(self.play_until, now) + len(pcm) / 2 / self.sample_rate
+        if self.process:
+            self.queue.put(pcm)
+
+    def _feed(self):
+        while True:
+            pcm = self.queue.get()
+            if pcm is None:
+                return
+            try:
+                self.process.stdin.write(pcm)
+                self.process.stdin.flush()
+            except OSError as e:
+                logging.error(f"Audio player failed: {e}")
+                return
+
+    def wait(self, until: float = None):
+        until = self.play_until if until is None else until
+        delay = until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def close(self):
+        if self.process:
+            self.queue.put(None)
+            self.feeder.join()
+            self.process.stdin.close()
+            self.process.wait()
+            self.process = None
+
+class Utterance:
+    def __init__(self, text: str, lang: str, discard: bool = False, keep_audio: bool = False, pcm: bytes = None):
+        self.text = text
+        self.lang = lang
+        # Warm-up utterances are synthesized but never played.
+        self.discard = discard
+        # The synthesized audio, if kept (e.g. for the response cache).
+        self.audio = bytearray() if keep_audio else None
+        # Audio synthesized earlier, played instead of running piper.
+        self.pcm = pcm
+        self.submitted = time.monotonic()
+        self.started = None         # When piper got the sentence.
+        self.first_audio = None     # When the first PCM bytes came back.
+        self.audio_bytes = 0
+        self.played_until = 0.0
+        self.finished = None        # When piper was done with the sentence.
+        self.sink = None
+        self.synthesized = threading.Event()
+
+    def time_to_first_audio(self):
+        return self.first_audio - self.submitted if self.first_audio else None
+
+    def serial_cost(self):
+        """Synthesis plus playback time, i.e. how long speaking it takes when nothing overlaps."""
+        if self.started is None or self.finished is None:
+            return 0.0
+        audio_seconds = self.audio_bytes / 2 / self.sink.sample_rate if self.sink else 0.0
+        return (self.finished - self.started) + audio_seconds
+
+    def wait(self):
+        """Block until the utterance has been synthesized and played."""
+        self.synthesized.wait()
+        if self.sink and not self.discard:
+            self.sink.wait(self.played_until)
+
+class PiperVoice:
+    """
+    A long-lived piper process for one voice.
+
+    The ONNX model is loaded once; piper then synthesizes every line written to its
+    stdin and streams the raw audio to stdout. Piper logs a "Real-time factor" line on
+    stderr after each sentence, once all of its audio has been written: the sentence is
+    complete when we have read what was in the stdout pipe at that point.
+    """
+    RTF_PATTERN = re.compile(r'Real-time factor')
+
+    def __init__(self, model: str, sink: AudioSink, piper_bin: str = './tts/piper/piper', extra_args=None):
+        self.model = model
+        self.sink = sink
+        piper_cmd = list(piper_bin) if isinstance(piper_bin, (list, tuple)) else [piper_bin]
+        self.args = piper_cmd + ['-m', model, '--output-raw'] + (extra_args or [])
+        self.process = None
+        self.current = None
+        self.bytes_read = 0
+        # Where the audio of the current sentence ends in the stdout stream, once known.
+        self.sentence_end = None
+        self.sentence_done = threading.Event()
+
+    def start(self):
+        logging.info(f"Starting TTS voice: {' '.join(self.args)}")
+        self.process = subprocess.Popen(self.args, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=subprocess.PIPE, bufsize=0)
+        threading.Thread(target=self._read, args=(self.process,), daemon=True).start()
+
+    @staticmethod
+    def _unread_bytes(fd):
+        return struct.unpack('i', fcntl.ioctl(fd, termios.FIONREAD, b'\0\0\0\0'))[0]
+
+    def _read(self, process):
+        # Audio and log on one thread, so "what was in the pipe when the log line came"
+        # isn't racing with another reader. Nothing here blocks but `select`.
+        out, err = process.stdout.fileno(), process.stderr.fileno()
+        fds = [out, err]
+        log = b''
+        while fds:
+            readable, _, _ = select.select(fds, [], [])
+            if out in readable:
+                pcm = os.read(out, 4096)
+                if pcm:
+                    self._audio(pcm)
+                else:
+                    fds.remove(out)
+            if err in readable:
+                data = os.read(err, 4096)
+                if not data:
+                    fds.remove(err)
+                log += data
+                *lines, log = log.split(b'\n')
+                for line in lines:
+                    line = line.decode(errors='replace').rstrip()
+                    if self.RTF_PATTERN.search(line):
+                        self.sentence_end = self.bytes_read + (self._unread_bytes(out) if out in fds else 0)
+                    elif line:
+                        logging.debug(f"piper: {line}")
+            if self.sentence_end is not None and self.bytes_read >= self.sentence_end:
+                self.sentence_end = None
+                self.sentence_done.set()
+        logging.info(f"TTS voice {self.model} exited")
+        # Don't leave anyone waiting on a dead process.
+        self.sentence_done.set()
+
+    def _audio(self, pcm):
+        self.bytes_read += len(pcm)
+        utt = self.current
+        if utt is not None:
+            if utt.first_audio is None:
+                utt.first_audio = time.monotonic()
+            utt.audio_bytes += len(pcm)
+            if utt.audio is not None:
+                utt.audio += pcm
+            if utt.discard:
+                return
+        self.sink.write(pcm)
+        if utt is not None:
+            utt.played_until = self.sink.play_until
+
+    def synthesize(self, utt: Utterance, timeout: float = 30.0):
+        """Synthesize one sentence, streaming its audio to the sink. Returns when piper is done with it."""
+        if self.process is None or self.process.poll() is not None:
+            self.start()
+        utt.sink = self.sink
+        utt.started = time.monotonic()
+        self.current = utt
+        self.sentence_done.clear()
+        # Piper synthesizes one line at a time, so the sentence must not contain line breaks.
+        self.process.stdin.write(utt.text.replace('\n', ' ').encode('utf-8') + b'\n')
+        self.process.stdin.flush()
+        if not self.sentence_done.wait(timeout):
+            logging.error(f"TTS timed out on: {utt.text}")
+        self.current = None
+
+    def close(self):
+        if self.process:
+            self.process.stdin.close()
+            self.process.wait()
+            self.process = None
+
+class TTSService:
+    """
+    Long-lived TTS: every voice is loaded once at startup, sentences are queued and
+    synthesized in order by a worker thread, audio goes to one persistent player per
+    sample rate (normally just one).
+
+    Args:
+        voices (dict): language prefix ('en', 'zh', ...) -> piper voice model (.onnx).
+        piper_bin (str or list): piper command, can be replaced by a stub for testing
+            (e.g. [sys.executable, 'tools/piper_stub.py']).
+        player (str): 'aplay' to play the audio, or None to discard it.
+        on_done (callable): called with each `Utterance` once it has been synthesized.
+        keep_audio (bool): keep the audio of every utterance in `Utterance.audio`.
+    """
+    def __init__(self, voices: dict, piper_bin: str = './tts/piper/piper', player: str = 'aplay', on_done=None,
+                 keep_audio: bool = False):
+        self.sinks = {}
+        self.voices = {}
+        for lang, model in voices.items():
+            rate = voice_sample_rate(model)
+            if rate not in self.sinks:
+                self.sinks[rate] = AudioSink.aplay(rate) if player == 'aplay' else AudioSink(rate)
+            self.voices[lang] = PiperVoice(model, self.sinks[rate], piper_bin)
+        self.queue = queue.Queue()
+        self.worker = None
+        self.last = None
+        self.on_done = on_done
+        self.keep_audio = keep_audio
+        # Total synthesis + playback time of everything spoken, see `Utterance.serial_cost`.
+        self.busy_time = 0.0
+
+    def start(self, warmup: bool = True):
+        for voice in self.voices.values():
+            voice.start()
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+        if warmup:
+            # The first inference of an ONNX session is much slower than the following ones.
+            t0 = time.monotonic()
+            warmups = [self.speak("Hello.", lang, block=False, discard=True) for lang in self.voices]
+            for utt in warmups:
+                utt.wait()
+            logging.info(f"TTS warm-up took {time.monotonic() - t0:.2f}s")
+
+    def voice_for(self, lang: str):
+        for prefix, voice in self.voices.items():
+            if lang.startswith(prefix):
+                return voice
+        return None
+
+    def sample_rate(self, lang: str):
+        voice = self.voice_for(lang)
+        return voice.sink.sample_rate if voice else None
+
+    def _play(self, utt: Utterance, sink: AudioSink):
+        utt.sink = sink
+        utt.started = utt.first_audio = time.monotonic()
+        utt.audio_bytes = len(utt.pcm)
+        sink.write(utt.pcm)
+        utt.played_until = sink.play_until
+
+    def _run(self):
+        while True:
+            utt = self.queue.get()
+            if utt is None:
+                break
+            voice = self.voice_for(utt.lang)
+            try:
+                if utt.pcm is not None:
+                    self._play(utt, voice.sink)
+                else:
+                    voice.synthesize(utt)
+            except (OSError, ValueError) as e:
+                logging.error(f"TTS failed on '{utt.text}': {e}")
+            finally:
+                utt.finished = time.monotonic()
+                if not utt.discard:
+                    self.busy_time += utt.serial_cost()
+                utt.synthesized.set()
+                if self.on_done and not utt.discard:
+                    self.on_done(utt)
+
+    def speak(self, text: str, lang: str = 'en', block: bool = True, discard: bool = False,
+              pcm: bytes = None) -> Utterance:
+        """
+        Queue a sentence. With `block`, return once it has been played.
+        With `pcm` (audio synthesized earlier with this voice), play it instead of synthesizing.
+        """
+        if not self.voice_for(lang):
+            logging.info("Unknown language: {}".format(lang))
+            return None
+        utt = Utterance(text, lang, discard=discard, keep_audio=self.keep_audio and pcm is None and not discard, pcm=pcm)
+        self.queue.put(utt)
+        if not discard:
+            self.last = utt
+        if block:
+            utt.wait()
+        return utt
+
+    def wait(self):
+        """Block until everything queued so far has been played."""
+        if self.last:
+            self.last.wait()
+
+    def close(self):
+        if self.worker:
+            self.queue.put(None)
+            self.worker.join()
+            self.worker = None
+        for voice in self.voices.values():
+            voice.close()
+        for sink in self.sinks.values():
+            sink.close()
+
+class SpeechQueue:
+    """
+    Speaks sentences from a background thread with a blocking `speak` function
+    (e.g. the macOS `say` command), so the caller can carry on meanwhile.
+    """
+    def __init__(self, speak):
+        self.speak = speak
+        self.queue = queue.Queue()
+        self.busy_time = 0.0
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+
+    def _run(self):
+        while True:
+            text, lang = self.queue.get()
+            t0 = time.monotonic()
+            try:
+                self.speak(text, lang)
+            except Exception as e:
+                logging.error(f"Failed to speak '{text}': {e}")
+            self.busy_time += time.monotonic() - t0
+            self.queue.task_done()
+
+    def put(self, text: str, lang: str = 'en'):
+        self.queue.put((text, lang))
+
+    def wait(self):
+        self.queue.join()
@@ -0,0 +1,127 @@
+import functools
+import logging
+import queue
+import tkinter as tk
+from tkinter import scrolledtext
+from PIL import Image, ImageTk
+
+logging.basicConfig(
+    format='%(asctime)s [%(levelname)s] %(filename)s:%(funcName)s: %(message)s',
+    level=logging.DEBUG,
+    handlers=[
+        logging.StreamHandler()  # Output logs to stdout
+    ]
+)
+
+class TkUI:
+    """
+    Tk front end for the LlamaPi pipeline: the logo, a round push-to-talk button and
+    a read-only text box with the conversation.
+
+    Register `on_event` as a pipeline listener. Events arrive on pipeline threads, but
+    Tk is not thread-safe: they are queued, and the Tk main loop applies them every
+    `frame_ms`, with streamed reply text batched per frame.
+    """
+    def __init__(self, title: str = "LlamaPi Robot", assistant: str = "Skyler", frame_ms: int = 33):
+        self.assistant = assistant
+        self.frame_ms = frame_ms
+        self.events = queue.Queue()
+
+        logging.debug("Starting UI")
+        # Create the main window
+        self.root = tk.Tk()
+        self.root.title(title)
+        self.root.geometry("800x500")
+
+        # Load the logo image from file
+        self.background_image = Image.open('LlamaPi_logo.jpg')
+        self.background_image.thumbnail((400, 300))  # Resize the image to fit in window
+
+        # Convert the image to PhotoImage format (required for tkinter)
+        self.background_image_tk = ImageTk.PhotoImage(self.background_image)
+
+        # Create a Label widget with the image as background
+        self.bglabel = tk.Label(self.root, image=self.background_image_tk)
+        # Place at top-left corner and full-size
+        self.bglabel.place(relx=0.5, rely=0.3, relwidth=0.5, relheight=0.5, anchor=tk.CENTER)
+
+        self.root.geometry("+0+0")   # Set window position to top-left corner
+
+        # Create a canvas to draw the round button
+        self.canvas = tk.Canvas(self.root, width=150, height=150, bg='white', highlightthickness=0)
+        # self.canvas.pack(pady=20)
+        self.canvas.place(relx=0.1, rely=0.6, anchor=tk.NW)
+
+        # Draw the round button (a circle)
+        self.push_button = self.canvas.create_oval(10, 10, 140, 140, fill='blue', outline='white')
+
+        # Add text to the button
+        self.button_text = self.canvas.create_text(75, 75, text="Hold to Talk", fill="white", font=('Helvetica', 14, 'bold'))
+
+        # Create a read-only scrolled text box
+        self.text_box = scrolledtext.ScrolledText(self.root, wrap=tk.WORD, width=48, height=9, font=("Helvetica", 12))
+        self.text_box.place(relx=0.3, rely=0.6, anchor=tk.NW)
+        self.text_box.config(state=tk.DISABLED)
+
+        self.root.after(self.frame_ms, self.drain_events)
+
+    def bind_button(self, on_press, on_release):
+        """Use the on-screen button for push-to-talk (when there is no GPIO button)."""
+        for item in (self.push_button, self.button_text):
+            self.canvas.tag_bind(item, '<ButtonPress-1>', lambda ev: on_press(ev))
+            self.canvas.tag_bind(item, '<ButtonRelease-1>', lambda ev: on_release(ev))
+
+    def on_event(self, kind, data=None):
+        # Called from any thread.
+        if kind in ('text', 'reply'):
+            self.events.put(data)
+        elif kind == 'transcript':
+            self.events.put(f"\nUser: {data}\n")
+        elif kind == 'reply_start':
+            self.events.put(f"{self.assistant}: ")
+        elif kind == 'command':
+            self.events.put(f"\nCommand: {data}\n")
+        elif kind == 'status':
+            self.events.put(functools.partial(self.canvas.itemconfig, self.button_text, text=data))
+        elif kind == 'button':
+            self.events.put(functools.partial(self.show_button_pressed, data))
+
+    def show_button_pressed(self, pressed):
+        if pressed:
+            # Change button appearance on press
+            self.canvas.itemconfig(self.push_button, fill='darkblue', outline='darkblue')
+            # canvas.itemconfig(text, fill='white')
+            self.canvas.scale(self.push_button, 75, 75, 0.95, 0.95)  # Slightly reduce the size
+        else:
+            # Revert button appearance on release
+            self.canvas.itemconfig(self.push_button, fill='blue', outline='white')
+            # canvas.itemconfig(text, fill='white')
+            self.canvas.scale(self.push_button, 75, 75, 1/0.95, 1/0.95)  # Revert the size
+
+    def insert_text(self, txt):
+        self.text_box.config(state=tk.NORMAL)
+        self.text_box.insert(tk.END, txt)
+        self.text_box.see(tk.END)
+        self.text_box.config(state=tk.DISABLED)
+
+    def drain_events(self):
+        # Runs on the Tk thread every `frame_ms`.
+        text = []
+        while True:
+            try:
+                event = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(event, str):
+                text.append(event)
+                continue
+            if text:
+                self.insert_text(''.join(text))
+                text = []
+            event()
+        if text:
+            self.insert_text(''.join(text))
+        self.root.after(self.frame_ms, self.drain_events)
+
+    def mainloop(self):
+        self.root.mainloop()
@@ -0,0 +1,162 @@
+import logging
+import numpy as np
+
+logging.basicConfig(
+    format='%(asctime)s [%(levelname)s] %(filename)s:%(funcName)s: %(message)s',
+    level=logging.DEBUG,
+    handlers=[
+        logging.StreamHandler()  # Output logs to stdout
+    ]
+)
+
+class VADBase:
+    """
+    Common trimming logic. Subclasses implement `speech_regions`, which returns a
+    list of (start, end) sample offsets that contain speech.
+    """
+    def __init__(self, sample_rate: int = 16000, padding: float = 0.2, max_silence: float = 0.6):
+        self.sample_rate = sample_rate
+        # Silence kept around each speech region, so word onsets/endings are not clipped.
+        self.padding = int(padding * sample_rate)
+        # Pauses inside the utterance longer than this are cut down to `2 * padding`.
+        self.max_silence = int(max_silence * sample_rate)
+
+    def speech_regions(self, audio: np.ndarray):
+        raise NotImplementedError
+
+    def _padded_regions(self, audio: np.ndarray):
+        regions = []
+        for start, end in self.speech_regions(audio):
+            start = max(0, start - self.padding)
+            end = min(len(audio), end + self.padding)
+            if regions and start - regions[-1][1] <= self.max_silence:
+                regions[-1] = (regions[-1][0], end)
+            else:
+                regions.append((start, end))
+        return regions
+
+    def speech_bounds(self, audio: np.ndarray):
+        """Returns (start, end) of the padded speech in `audio`, or None if it is all silence."""
+        regions = self._padded_regions(audio)
+        if not regions:
+            return None
+        return regions[0][0], regions[-1][1]
+
+    def trim(self, audio: np.ndarray):
+        """
+        Cut leading/trailing silence and long pauses.
+
+        Returns:
+            tuple: (trimmed audio, seconds of audio dropped)
+        """
+        regions = self._padded_regions(audio)
+        if len(regions) == 1:
+            trimmed = audio[regions[0][0]:regions[0][1]]
+        elif regions:
+            trimmed = np.concatenate([audio[s:e] for s, e in regions])
+        else:
+            trimmed = audio[:0]
+        return trimmed, (len(audio) - len(trimmed)) / self.sample_rate
+
+class EnergyVAD(VADBase):
+    """
+    Frame energy VAD. A frame is speech if its RMS level is above both an absolute
+    floor and the estimated noise floor of the recording plus a margin.
+
+    The noise floor is the level of the quietest frames. When no frame is `margin_db`
+    louder than those (all speech, or all noise), there is no floor to tell speech
+    from, and only the absolute floor is used.
+    """
+    def __init__(self, sample_rate: int = 16000, frame_ms: int = 30,
+                 threshold_db: float = -45.0, margin_db: float = 12.0, **kwargs):
+        super().__init__(sample_rate, **kwargs)
+        self.frame_size = sample_rate * frame_ms // 1000
+        self.threshold_db = threshold_db
+        self.margin_db = margin_db
+
+    def frame_energies(self, audio: np.ndarray) -> np.ndarray:
+        num_frames = len(audio) // self.frame_size
+        frames = audio[:num_frames * self.frame_size].reshape(num_frames, self.frame_size)
+        rms = np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1))
+        return 20 * np.log10(rms + 1e-10)
+
+    def noise_floor(self, energies: np.ndarray):
+        """The level of the background noise, or None if there is no quiet part to estimate it from."""
+        floor = np.percentile(energies, 10)
+        if np.max(energies) - floor < self.margin_db:
+            return None
+        return floor
+
+    def speech_regions(self, audio: np.ndarray):
+        energies = self.frame_energies(audio)
+        if len(energies) == 0:
+            return []
+        noise_floor = self.noise_floor(energies)
+        threshold = self.threshold_db if noise_floor is None else max(self.threshold_db, noise_floor + self.margin_db)
+        speech = energies > threshold
+        # Rising and falling edges of the speech mask.
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], speech.astype(np.int8), [0]))))
+        return [(s * self.frame_size, e * self.frame_size) for s, e in zip(edges[::2], edges[1::2])]
+
+class SileroVAD(VADBase):
+    """Small neural VAD bundled with faster_whisper (runs on CPU via onnxruntime)."""
+    def __init__(self, sample_rate: int = 16000, threshold: float = 0.5, **kwargs):
+        super().__init__(sample_rate, **kwargs)
+        from faster_whisper.vad import VadOptions
+        self.options = VadOptions(threshold=threshold, speech_pad_ms=0)
+
+    def speech_regions(self, audio: np.ndarray):
+        from faster_whisper.vad import get_speech_timestamps
+        return [(ts['start'], ts['end']) for ts in get_speech_timestamps(audio, self.options)]
+
+class Endpointer:
+    """
+    Streaming utterance detection for hands-free mode.
+
+    Feed it the raw 16-bit chunks from the microphone. `process` returns "start" when
+    speech begins and "end" once the speech has been followed by `silence_timeout`
+    seconds of silence. Utterances shorter than `min_speech` are treated as noise.
+    """
+    def __init__(self, vad: EnergyVAD, silence_timeout: float = 1.0, min_speech: float = 0.3):
+        self.vad = vad
+        self.silence_timeout = silence_timeout
+        self.min_speech = min_speech
+        self.reset()
+
+    def reset(self):
+        self.noise_floor = None
+        self.in_speech = False
+        self.speech_time = 0.0
+        self.silence_time = 0.0
+
+    def process(self, chunk: bytes):
+        audio = np.frombuffer(chunk, dtype=np.int16).astype(np.float32) / 32768.0
+        duration = len(audio) / self.vad.sample_rate
+        level = float(np.max(self.vad.frame_energies(audio), initial=-200.0))
+        if self.noise_floor is None:
+            self.noise_floor = level
+        speech = level > max(self.vad.threshold_db, self.noise_floor + self.vad.margin_db)
+        if not speech:
+            # Slowly track the background noise while nobody is talking.
+            self.noise_floor = 0.95 * self.noise_floor + 0.05 * level
+
+        if not self.in_speech:
+            if speech:
+                self.in_speech = True
+                self.speech_time = duration
+                self.silence_time = 0.0
+                return "start"
+            return None
+
+        if speech:
+            self.speech_time += duration
+            self.silence_time = 0.0
+            return None
+        self.silence_time += duration
+        if self.silence_time >= self.silence_timeout:
+            self.in_speech = False
+            if self.speech_time < self.min_speech:
+                logging.debug(f"Ignoring {self.speech_time:.2f}s of noise")
+                return "cancel"
+            return "end"
+        return None